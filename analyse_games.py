@@ -0,0 +1,314 @@
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import shlex
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pyffish
+
+import engine
+from engine_pool import EnginePool
+
+VARIANT = 'losalamos'
+GAMES_DIR = "games/"
+DEFAULT_OUTPUT = "analysis.json"
+# Finished positions are appended here as they complete, so an interrupted
+# run can carry on where it stopped.
+PROGRESS_SUFFIX = ".progress.jsonl"
+DEFAULT_MOVE_TIME = 500
+
+# Scores are capped at this many centipawns (mates count as the cap), so one
+# mate doesn't swamp a games accuracy.
+SCORE_CAP = 1000
+# A move that loses at least this many centipawns is flagged as a blunder.
+BLUNDER_LOSS = 300
+
+# Lichess' win chance and accuracy formulas.
+WIN_CHANCE_SLOPE = -0.00368208
+ACCURACY_SCALE = 103.1668
+ACCURACY_DECAY = -0.04354
+ACCURACY_OFFSET = 3.1669
+
+# How often progress is printed, in seconds.
+REPORT_INTERVAL = 5
+
+MOVE_PATTERN = re.compile(r"\d+\. (\S+)")
+
+
+def parse_game(path: str) -> dict:
+    """
+    Reads a game saved by save_game() in gui.play().
+    :param path: The path of the saved game.
+    :return: A dict with the header fields (e.g. `User`, `White`, `Result`)
+     and `moves`, the list of moves in LAN.
+    """
+    game = {}
+    with open(path) as file:
+        text = file.read()
+
+    lines = text.split("\n")
+    for line in lines:
+        if ": " in line and not MOVE_PATTERN.match(line):
+            key, value = line.split(": ", 1)
+            game[key] = value
+
+    # The moves are on the last line, e.g. '1. a2a3 2. a5a4 '.
+    game['moves'] = MOVE_PATTERN.findall(lines[-1])
+    return game
+
+
+def game_positions(moves: list[str]) -> list[str]:
+    """
+    :param moves: The moves of a game in LAN.
+    :return: The FEN of every position in the game, from the start position
+     to the position after the last move.
+    """
+    fen = pyffish.start_fen(VARIANT)
+    positions = [fen]
+    for move in moves:
+        fen = pyffish.get_fen(VARIANT, fen, [move])
+        positions.append(fen)
+    return positions
+
+
+def capped_score(line: dict) -> int:
+    """
+    :param line: A line from Engine.analyse().
+    :return: The score in centipawns from the side to moves point of view,
+     capped at SCORE_CAP. Mates count as the cap.
+    """
+    if line['score_type'] == 'mate':
+        return SCORE_CAP if line['score'] > 0 else -SCORE_CAP
+    return max(-SCORE_CAP, min(line['score'], SCORE_CAP))
+
+
+def evaluate(pool_engine: engine.Engine, fen: str, move_time: int) -> int:
+    """
+    Scores a position.
+    :param pool_engine: The engine to search with.
+    :param fen: The position.
+    :param move_time: How long to search, in milliseconds.
+    :return: The score in centipawns from the side to moves point of view.
+    """
+    # Games end in checkmate or stalemate, where there is nothing to search.
+    if not pyffish.legal_moves(VARIANT, fen, []):
+        if pyffish.gives_check(VARIANT, fen, []):
+            return -SCORE_CAP
+        return 0
+
+    lines = pool_engine.analyse(fen, 1, move_time)
+    if not lines:
+        # A missing score would be recorded as a level position.
+        raise engine.EngineError(f"The engine gave no score for {fen}.")
+    return capped_score(lines[0])
+
+
+def evaluate_game(pool: EnginePool, name: str,
+                  positions: list[tuple[int, str]], move_time: int,
+                  record: Callable[[str, int, int], None]) -> None:
+    """
+    Scores the positions of one game in order, with one of the pools
+    engines. Checking an engine out resets it, so it is done once per game
+    rather than once per position.
+    :param pool: The engine pool.
+    :param name: The games file name.
+    :param positions: The ply and FEN of each position to score.
+    :param move_time: How long to search each position, in milliseconds.
+    :param record: Called with the game name, ply and score of each
+     position as it is scored.
+    """
+    with pool.engine(analysis=True) as pool_engine:
+        for ply, fen in positions:
+            record(name, ply, evaluate(pool_engine, fen, move_time))
+
+
+def win_chance(score: int) -> float:
+    """
+    :param score: A score in centipawns.
+    :return: The chance of winning from the score, from 0 to 100.
+    """
+    return 50 + 50 * (2 / (1 + math.exp(WIN_CHANCE_SLOPE * score)) - 1)
+
+
+def move_accuracy(before: int, after: int) -> float:
+    """
+    :param before: The score before the move, from the movers point of view.
+    :param after: The score after the move, from the movers point of view.
+    :return: The accuracy of the move, from 0 to 100.
+    """
+    lost = max(win_chance(before) - win_chance(after), 0)
+    accuracy = ACCURACY_SCALE * math.exp(ACCURACY_DECAY * lost) - \
+        ACCURACY_OFFSET
+    return max(0.0, min(accuracy, 100.0))
+
+
+def game_report(name: str, game: dict, scores: list[int]) -> dict:
+    """
+    Works out how good each move of a game was.
+    :param name: The games file name.
+    :param game: The result of parse_game().
+    :param scores: The score of every position in the game, from the side to
+     moves point of view.
+    :return: The report, with the game header, `moves` (one dict per move
+     with `ply`, `move`, `score_before`, `score_after`, `loss`, `accuracy`
+     and `blunder`) and `accuracy` (the average for white and black).
+    """
+    moves = []
+    accuracies = ([], [])
+    for ply, move in enumerate(game['moves']):
+        before = scores[ply]
+        # The next position is scored from the opponents point of view.
+        after = -scores[ply + 1]
+        loss = max(before - after, 0)
+        accuracy = move_accuracy(before, after)
+        accuracies[ply % 2].append(accuracy)
+        moves.append({'ply': ply + 1, 'move': move, 'score_before': before,
+                      'score_after': after, 'loss': loss,
+                      'accuracy': round(accuracy, 1),
+                      'blunder': loss >= BLUNDER_LOSS})
+
+    def average(values: list[float]) -> float | None:
+        return round(sum(values) / len(values), 1) if values else None
+
+    header = {key: value for key, value in game.items() if key != 'moves'}
+    return {'game': name, **header, 'moves': moves,
+            'accuracy': {'white': average(accuracies[0]),
+                         'black': average(accuracies[1])}}
+
+
+def load_progress(path: str) -> dict[tuple[str, int], int]:
+    """
+    Reads the positions finished by an earlier run.
+    :param path: The progress file.
+    :return: The scores, keyed by (game name, ply).
+    """
+    done = {}
+    if not os.path.exists(path):
+        return done
+
+    with open(path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The last line may be cut short if the run was killed.
+                continue
+            done[(record['game'], record['ply'])] = record['score']
+    return done
+
+
+def analyse_games(games_dir: str = GAMES_DIR, output: str = DEFAULT_OUTPUT,
+                  workers: int | None = None,
+                  move_time: int = DEFAULT_MOVE_TIME,
+                  path: list | None = None) -> dict:
+    """
+    Scores every position of every saved game across a pool of engines,
+    then writes a report for each game.
+    :param games_dir: The folder of saved games.
+    :param output: The report file (JSON).
+    :param workers: The number of engine processes. Defaults to the number
+     of cores.
+    :param move_time: How long to search each position, in milliseconds.
+    :param path: The command used to start each engine.
+    :return: Returns a dict with keys `positions` (analysed this run),
+     `seconds` and `positions_per_second`.
+    """
+    workers = workers or os.cpu_count() or 1
+    progress_path = output + PROGRESS_SUFFIX
+    done = load_progress(progress_path)
+
+    games = {}
+    # The positions still to score, keyed by game name.
+    jobs = {}
+    for game_path in sorted(glob.glob(os.path.join(games_dir, "*.txt"))):
+        name = os.path.basename(game_path)
+        game = parse_game(game_path)
+        games[name] = game
+        positions = [(ply, fen) for ply, fen
+                     in enumerate(game_positions(game['moves']))
+                     if (name, ply) not in done]
+        if positions:
+            jobs[name] = positions
+    total = sum(len(positions) for positions in jobs.values())
+
+    start = time.perf_counter()
+    last_report = start
+    finished = 0
+    # Scores are recorded from every worker thread.
+    lock = threading.Lock()
+    if jobs:
+        pool = EnginePool(min(workers, len(jobs)), path,
+                          max_analysis=min(workers, len(jobs)))
+        try:
+            with ThreadPoolExecutor(max_workers=pool.size) as executor, \
+                    open(progress_path, "a") as progress:
+
+                def record(name: str, ply: int, score: int) -> None:
+                    nonlocal finished, last_report
+                    with lock:
+                        done[(name, ply)] = score
+                        progress.write(json.dumps(
+                            {'game': name, 'ply': ply, 'score': score}) +
+                            "\n")
+                        progress.flush()
+
+                        finished += 1
+                        now = time.perf_counter()
+                        if now - last_report >= REPORT_INTERVAL:
+                            print(f"{finished}/{total} positions, "
+                                  f"{finished / (now - start):.1f} "
+                                  f"positions/sec")
+                            last_report = now
+
+                futures = [executor.submit(evaluate_game, pool, name,
+                                           positions, move_time, record)
+                           for name, positions in jobs.items()]
+                for future in as_completed(futures):
+                    future.result()
+        finally:
+            pool.close()
+
+    seconds = time.perf_counter() - start
+    reports = []
+    for name, game in games.items():
+        scores = [done[(name, ply)] for ply in range(len(game['moves']) + 1)]
+        reports.append(game_report(name, game, scores))
+
+    with open(output, "w") as file:
+        json.dump(reports, file, indent=2)
+
+    return {'positions': finished, 'seconds': seconds,
+            'positions_per_second': finished / seconds if seconds else 0.0}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Analyse every saved game with a pool of engines.")
+    parser.add_argument("--games-dir", default=GAMES_DIR,
+                        help="the folder of saved games")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                        help="the report file to write")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="the number of engine processes")
+    parser.add_argument("--move-time", type=int, default=DEFAULT_MOVE_TIME,
+                        help="milliseconds to search each position")
+    parser.add_argument("--engine", default=None,
+                        help="the command used to start the engine")
+    args = parser.parse_args()
+
+    path = shlex.split(args.engine) if args.engine else engine.DEFAULT_PATH
+    result = analyse_games(args.games_dir, args.output, args.workers,
+                           args.move_time, path)
+    print(f"Analysed {result['positions']} positions in "
+          f"{result['seconds']:.1f} s "
+          f"({result['positions_per_second']:.1f} positions/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,589 @@
+import argparse
+import random
+
+import pyffish
+
+VARIANT = 'losalamos'
+
+# Squares are numbered 0 (a1) to 35 (f6), rank by rank. A bitboard is an int
+# with bit n set if square n is in the set.
+FILES = 6
+RANKS = 6
+SQUARES = FILES * RANKS
+ALL_SQUARES = (1 << SQUARES) - 1
+FILE_LETTERS = "abcdef"
+
+WHITE = 0
+BLACK = 1
+
+# Los Alamos has no bishops, castling, en passant or pawn double steps.
+PAWN, KNIGHT, ROOK, QUEEN, KING = range(5)
+PIECE_LETTERS = "pnrqk"
+# Pawns promote to these, in the order pyffish lists them.
+PROMOTIONS = "qrn"
+
+# Ray directions as (file, rank) steps. Squares further along a positive ray
+# have higher numbers, so the nearest blocker is the lowest set bit.
+NORTH, EAST, SOUTH, WEST = (0, 1), (1, 0), (0, -1), (-1, 0)
+NORTH_EAST, SOUTH_EAST = (1, 1), (1, -1)
+SOUTH_WEST, NORTH_WEST = (-1, -1), (-1, 1)
+ORTHOGONAL = (NORTH, EAST, SOUTH, WEST)
+DIAGONAL = (NORTH_EAST, SOUTH_EAST, SOUTH_WEST, NORTH_WEST)
+POSITIVE = (NORTH, EAST, NORTH_EAST, NORTH_WEST)
+
+KNIGHT_STEPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1),
+                (-2, 1), (-1, 2))
+KING_STEPS = ORTHOGONAL + DIAGONAL
+
+
+def square_name(square: int) -> str:
+    """
+    :param square: The square number, 0 to 35.
+    :return: The square in algebraic notation, e.g. 0 -> a1, 35 -> f6.
+    """
+    return FILE_LETTERS[square % FILES] + str(square // FILES + 1)
+
+
+def square_number(name: str) -> int:
+    """
+    :param name: The square in algebraic notation, e.g. 'e3'.
+    :return: The square number, 0 to 35.
+    """
+    return FILE_LETTERS.index(name[0]) + (int(name[1]) - 1) * FILES
+
+
+def step_mask(square: int, steps: tuple) -> int:
+    """
+    :param square: The square to step from.
+    :param steps: The (file, rank) steps.
+    :return: The bitboard of the squares reached by one of the steps.
+    """
+    file, rank = square % FILES, square // FILES
+    mask = 0
+    for file_step, rank_step in steps:
+        new_file, new_rank = file + file_step, rank + rank_step
+        if 0 <= new_file < FILES and 0 <= new_rank < RANKS:
+            mask |= 1 << (new_rank * FILES + new_file)
+    return mask
+
+
+def ray_mask(square: int, direction: tuple[int, int]) -> int:
+    """
+    :param square: The square the ray starts from (not included).
+    :param direction: The (file, rank) step of the ray.
+    :return: The bitboard of every square on the ray to the edge.
+    """
+    file, rank = square % FILES, square // FILES
+    mask = 0
+    while True:
+        file, rank = file + direction[0], rank + direction[1]
+        if not (0 <= file < FILES and 0 <= rank < RANKS):
+            return mask
+        mask |= 1 << (rank * FILES + file)
+
+
+# Precomputed attack tables, indexed by square.
+KNIGHT_ATTACKS = [step_mask(square, KNIGHT_STEPS)
+                  for square in range(SQUARES)]
+KING_ATTACKS = [step_mask(square, KING_STEPS) for square in range(SQUARES)]
+# The squares a pawn of each colour attacks.
+PAWN_ATTACKS = ([step_mask(square, ((-1, 1), (1, 1)))
+                 for square in range(SQUARES)],
+                [step_mask(square, ((-1, -1), (1, -1)))
+                 for square in range(SQUARES)])
+RAYS = {direction: [ray_mask(square, direction)
+                    for square in range(SQUARES)]
+        for direction in ORTHOGONAL + DIAGONAL}
+# The squares strictly between two squares on a line, or 0 if they aren't on
+# a line.
+BETWEEN = [[0] * SQUARES for _ in range(SQUARES)]
+for _square in range(SQUARES):
+    for _direction in ORTHOGONAL + DIAGONAL:
+        for _target in range(SQUARES):
+            if RAYS[_direction][_square] >> _target & 1:
+                BETWEEN[_square][_target] = RAYS[_direction][_square] & \
+                    ~RAYS[_direction][_target] & ~(1 << _target)
+# The last rank for each colour's pawns.
+PROMOTION_RANKS = (((1 << FILES) - 1) << (FILES * (RANKS - 1)),
+                   (1 << FILES) - 1)
+
+# Zobrist keys: a random 64-bit number for each piece on each square, and
+# one for black to move. A position's key is the XOR of the numbers that
+# apply to it, so a move updates it with a few XORs. Los Alamos has no
+# castling or en passant, and a promotion is just a different piece on the
+# square, so nothing else needs a number. The seed is fixed so keys are the
+# same every run, and can be saved.
+ZOBRIST_SEED = 0x6C6F73616C616D6F
+ZOBRIST_BITS = 64
+_zobrist_random = random.Random(ZOBRIST_SEED)
+ZOBRIST_PIECES = [[[_zobrist_random.getrandbits(ZOBRIST_BITS)
+                    for _ in range(SQUARES)]
+                   for _ in range(len(PIECE_LETTERS))]
+                  for _ in (WHITE, BLACK)]
+ZOBRIST_BLACK = _zobrist_random.getrandbits(ZOBRIST_BITS)
+
+
+def first_blocker(direction: tuple[int, int], blockers: int) -> int:
+    """
+    :param direction: The direction of the ray.
+    :param blockers: The occupied squares on the ray. Must not be 0.
+    :return: The square of the blocker nearest the start of the ray.
+    """
+    if direction in POSITIVE:
+        return (blockers & -blockers).bit_length() - 1
+    return blockers.bit_length() - 1
+
+
+def ray_attacks(square: int, direction: tuple[int, int],
+                occupied: int) -> int:
+    """
+    :param square: The square of the sliding piece.
+    :param direction: The direction it slides in.
+    :param occupied: The bitboard of every piece.
+    :return: The squares attacked along the ray, up to and including the
+     first piece in the way.
+    """
+    attacks = RAYS[direction][square]
+    blockers = attacks & occupied
+    if blockers:
+        attacks ^= RAYS[direction][first_blocker(direction, blockers)]
+    return attacks
+
+
+def squares(bitboard: int):
+    """
+    Yields the square number of every set bit, lowest first.
+    :param bitboard: The bitboard.
+    """
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+class Position:
+    def __init__(self, fen: str) -> None:
+        """
+        A Los Alamos position stored as bitboards, with a legal move
+        generator that doesn't need pyffish.
+        :param fen: The FEN string of the position.
+        """
+        # pieces[colour][piece type] is a bitboard.
+        self.pieces = [[0] * len(PIECE_LETTERS), [0] * len(PIECE_LETTERS)]
+
+        fields = fen.split(' ')
+        for rank, row in enumerate(reversed(fields[0].split('/'))):
+            file = 0
+            for letter in row:
+                if letter.isdigit():
+                    file += int(letter)
+                    continue
+                colour = WHITE if letter.isupper() else BLACK
+                piece_type = PIECE_LETTERS.index(letter.lower())
+                self.pieces[colour][piece_type] |= 1 << (rank * FILES + file)
+                file += 1
+
+        self.turn = WHITE if fields[1] == 'w' else BLACK
+        # Plies since the last capture or pawn move, and the move number.
+        self.halfmove = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove = int(fields[5]) if len(fields) > 5 else 1
+        # The Zobrist key. Leaves out the move clocks, so the same position
+        # reached at a different move number has the same key.
+        self.key = self.compute_key()
+        # One record per move played by push(), so pop() can take it back:
+        # (move, piece type moved, piece type captured or None, halfmove
+        # clock and key before the move).
+        self.undo_stack: list[tuple[str, int, int | None, int, int]] = []
+
+    def compute_key(self) -> int:
+        """
+        Works out the Zobrist key from scratch. push() updates self.key
+        without this.
+        :return: The 64-bit Zobrist key of the position.
+        """
+        key = ZOBRIST_BLACK if self.turn == BLACK else 0
+        for colour in (WHITE, BLACK):
+            for piece_type, bitboard in enumerate(self.pieces[colour]):
+                for square in squares(bitboard):
+                    key ^= ZOBRIST_PIECES[colour][piece_type][square]
+        return key
+
+    def piece_at(self, square: int) -> tuple[int, int] | None:
+        """
+        :param square: The square number.
+        :return: The colour and piece type on the square, or None if it is
+         empty.
+        """
+        bit = 1 << square
+        for colour in (WHITE, BLACK):
+            for piece_type, bitboard in enumerate(self.pieces[colour]):
+                if bitboard & bit:
+                    return colour, piece_type
+        return None
+
+    def push(self, move: str) -> None:
+        """
+        Plays a move, updating the position in place. The move isn't checked
+        for legality.
+        :param move: The move in LAN, e.g. 'a2a3' or 'b5b6q'.
+        """
+        origin = square_number(move[:2])
+        target = square_number(move[2:4])
+        turn = self.turn
+        pieces = self.pieces[turn]
+        enemy = self.pieces[1 - turn]
+
+        piece_type = self.piece_at(origin)[1]
+        target_bit = 1 << target
+        key = self.key ^ ZOBRIST_BLACK
+        captured = None
+        for enemy_type in range(len(PIECE_LETTERS)):
+            if enemy[enemy_type] & target_bit:
+                enemy[enemy_type] ^= target_bit
+                key ^= ZOBRIST_PIECES[1 - turn][enemy_type][target]
+                captured = enemy_type
+                break
+        self.undo_stack.append((move, piece_type, captured, self.halfmove,
+                                self.key))
+
+        pieces[piece_type] ^= 1 << origin
+        key ^= ZOBRIST_PIECES[turn][piece_type][origin]
+        if len(move) > 4:
+            placed = PIECE_LETTERS.index(move[4])
+        else:
+            placed = piece_type
+        pieces[placed] |= target_bit
+        key ^= ZOBRIST_PIECES[turn][placed][target]
+        self.key = key
+
+        if captured is not None or piece_type == PAWN:
+            self.halfmove = 0
+        else:
+            self.halfmove += 1
+        if turn == BLACK:
+            self.fullmove += 1
+        self.turn = 1 - turn
+
+    def pop(self) -> str:
+        """
+        Takes back the last move played by push(), restoring the position
+        exactly as it was.
+        :return: The move taken back, in LAN.
+        """
+        move, piece_type, captured, halfmove, key = self.undo_stack.pop()
+        self.turn = turn = 1 - self.turn
+        if turn == BLACK:
+            self.fullmove -= 1
+        self.halfmove = halfmove
+        self.key = key
+
+        origin_bit = 1 << square_number(move[:2])
+        target_bit = 1 << square_number(move[2:4])
+        pieces = self.pieces[turn]
+        if len(move) > 4:
+            pieces[PIECE_LETTERS.index(move[4])] ^= target_bit
+        else:
+            pieces[piece_type] ^= target_bit
+        pieces[piece_type] |= origin_bit
+        if captured is not None:
+            self.pieces[1 - turn][captured] |= target_bit
+        return move
+
+    def fen(self) -> str:
+        """
+        :return: The FEN string of the position, in the same form as
+         pyffish.get_fen().
+        """
+        rows = []
+        for rank in range(RANKS - 1, -1, -1):
+            row = ""
+            empty = 0
+            for file in range(FILES):
+                found = self.piece_at(rank * FILES + file)
+                if found is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                colour, piece_type = found
+                letter = PIECE_LETTERS[piece_type]
+                row += letter.upper() if colour == WHITE else letter
+            if empty:
+                row += str(empty)
+            rows.append(row)
+
+        turn = 'w' if self.turn == WHITE else 'b'
+        return f"{'/'.join(rows)} {turn} - - {self.halfmove} {self.fullmove}"
+
+    def occupied_by(self, colour: int) -> int:
+        """
+        :param colour: WHITE or BLACK.
+        :return: The bitboard of the colour's pieces.
+        """
+        pieces = self.pieces[colour]
+        return pieces[PAWN] | pieces[KNIGHT] | pieces[ROOK] | pieces[QUEEN] \
+            | pieces[KING]
+
+    def attackers(self, square: int, colour: int, occupied: int) -> int:
+        """
+        :param square: The square attacked.
+        :param colour: The colour of the attackers.
+        :param occupied: The bitboard of every piece, which can leave pieces
+         out to see through them.
+        :return: The bitboard of the colour's pieces that attack the square.
+        """
+        pieces = self.pieces[colour]
+        attackers = KNIGHT_ATTACKS[square] & pieces[KNIGHT]
+        attackers |= KING_ATTACKS[square] & pieces[KING]
+        # A pawn attacks the square if a pawn of the other colour standing
+        # there would attack the pawn.
+        attackers |= PAWN_ATTACKS[1 - colour][square] & pieces[PAWN]
+
+        straight = pieces[ROOK] | pieces[QUEEN]
+        if straight:
+            for direction in ORTHOGONAL:
+                attackers |= ray_attacks(square, direction, occupied) & \
+                    straight
+        if pieces[QUEEN]:
+            for direction in DIAGONAL:
+                attackers |= ray_attacks(square, direction, occupied) & \
+                    pieces[QUEEN]
+        return attackers
+
+    def king_square(self, colour: int) -> int:
+        """
+        :param colour: WHITE or BLACK.
+        :return: The square of the colour's king.
+        """
+        return self.pieces[colour][KING].bit_length() - 1
+
+    def is_check(self) -> bool:
+        """
+        :return: True if the side to move is in check.
+        """
+        occupied = self.occupied_by(WHITE) | self.occupied_by(BLACK)
+        return bool(self.attackers(self.king_square(self.turn),
+                                   1 - self.turn, occupied))
+
+    def pins(self, king: int, us: int, occupied: int) -> dict[int, int]:
+        """
+        Finds the side to moves pieces that are pinned to their king.
+        :param king: The square of the king.
+        :param us: The bitboard of the side to moves pieces.
+        :param occupied: The bitboard of every piece.
+        :return: The squares a pinned piece may move to (along the pin, up
+         to and including the pinning piece), keyed by the pinned pieces
+         square.
+        """
+        enemy = self.pieces[1 - self.turn]
+        pinned = {}
+        for direction in ORTHOGONAL + DIAGONAL:
+            if direction in ORTHOGONAL:
+                sliders = enemy[ROOK] | enemy[QUEEN]
+            else:
+                sliders = enemy[QUEEN]
+            ray = RAYS[direction][king]
+            if not ray & sliders:
+                continue
+
+            blockers = ray & occupied
+            if not blockers:
+                continue
+            first = first_blocker(direction, blockers)
+            if not us >> first & 1:
+                continue
+
+            beyond = RAYS[direction][first] & occupied
+            if not beyond:
+                continue
+            pinner = first_blocker(direction, beyond)
+            if sliders >> pinner & 1:
+                pinned[first] = BETWEEN[king][pinner] | 1 << pinner
+        return pinned
+
+    def legal_moves(self) -> list[str]:
+        """
+        Generates every legal move for the side to move.
+        :return: The legal moves in LAN, e.g. ['a2a3', 'b5b6q'].
+        """
+        turn = self.turn
+        pieces = self.pieces[turn]
+        us = self.occupied_by(turn)
+        them = self.occupied_by(1 - turn)
+        occupied = us | them
+        king = self.king_square(turn)
+        moves = []
+
+        # King moves: the king can't stay on a line it is checked along, so
+        # it is taken off the board when testing the squares it moves to.
+        without_king = occupied ^ (1 << king)
+        for target in squares(KING_ATTACKS[king] & ~us):
+            if not self.attackers(target, 1 - turn, without_king):
+                moves.append(square_name(king) + square_name(target))
+
+        checkers = self.attackers(king, 1 - turn, occupied)
+        if checkers & (checkers - 1):
+            # Double check: only the king can move.
+            return moves
+        if checkers:
+            # Capture the checker or block the check.
+            checker = checkers.bit_length() - 1
+            allowed = checkers | BETWEEN[king][checker]
+        else:
+            allowed = ALL_SQUARES
+        pinned = self.pins(king, us, occupied)
+
+        def add(origin: int, targets: int, promote: bool = False) -> None:
+            targets &= allowed
+            if origin in pinned:
+                targets &= pinned[origin]
+            start = square_name(origin)
+            for target in squares(targets):
+                move = start + square_name(target)
+                if promote and PROMOTION_RANKS[turn] >> target & 1:
+                    moves.extend(move + letter for letter in PROMOTIONS)
+                else:
+                    moves.append(move)
+
+        forward = FILES if turn == WHITE else -FILES
+        for origin in squares(pieces[PAWN]):
+            targets = PAWN_ATTACKS[turn][origin] & them
+            push = origin + forward
+            if 0 <= push < SQUARES and not occupied >> push & 1:
+                targets |= 1 << push
+            add(origin, targets, True)
+
+        for origin in squares(pieces[KNIGHT]):
+            add(origin, KNIGHT_ATTACKS[origin] & ~us)
+
+        for origin in squares(pieces[ROOK] | pieces[QUEEN]):
+            targets = 0
+            for direction in ORTHOGONAL:
+                targets |= ray_attacks(origin, direction, occupied)
+            if pieces[QUEEN] >> origin & 1:
+                for direction in DIAGONAL:
+                    targets |= ray_attacks(origin, direction, occupied)
+            add(origin, targets & ~us)
+
+        return moves
+
+
+def legal_moves(fen: str) -> list[str]:
+    """
+    :param fen: The FEN string of the position.
+    :return: The legal moves in the position, in LAN.
+    """
+    return Position(fen).legal_moves()
+
+
+def cross_check(fen: str) -> tuple[set[str], set[str]]:
+    """
+    Compares the legal moves from this generator with pyffish's.
+    :param fen: The FEN string of the position.
+    :return: The moves only this generator found, and the moves only pyffish
+     found. Both are empty if they agree.
+    """
+    ours = set(legal_moves(fen))
+    theirs = set(pyffish.legal_moves(VARIANT, fen, []))
+    return ours - theirs, theirs - ours
+
+
+def zobrist_collisions(count: int, rng: random.Random) -> int:
+    """
+    Looks for Zobrist collisions between random placements of pieces. The
+    positions don't have to be legal, as the keys don't depend on legality.
+    :param count: The number of random positions to make.
+    :param rng: The random number generator.
+    :return: The number of pairs of different positions with the same key.
+    """
+    seen: dict[int, tuple] = {}
+    collisions = 0
+    for _ in range(count):
+        pieces = rng.randint(2, SQUARES)
+        placement = tuple(sorted(
+            (square, rng.randrange(2), rng.randrange(len(PIECE_LETTERS)))
+            for square in rng.sample(range(SQUARES), pieces)))
+        turn = rng.randrange(2)
+        key = ZOBRIST_BLACK if turn == BLACK else 0
+        for square, colour, piece_type in placement:
+            key ^= ZOBRIST_PIECES[colour][piece_type][square]
+        if seen.setdefault(key, (placement, turn)) != (placement, turn):
+            collisions += 1
+    return collisions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Check the bitboard move generator, FENs and Zobrist "
+                    "keys against pyffish over random games.")
+    parser.add_argument("--games", type=int, default=100,
+                        help="the number of random games to play")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="the random seed")
+    parser.add_argument("--random-positions", type=int, default=0,
+                        help="also check this many random piece placements "
+                             "for Zobrist collisions")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.random_positions:
+        collisions = zobrist_collisions(args.random_positions, rng)
+        print(f"{collisions} Zobrist collisions in {args.random_positions} "
+              f"random positions.")
+        if collisions:
+            raise SystemExit(1)
+
+    positions = 0
+    # Every position seen, keyed by Zobrist key, to look for collisions.
+    seen: dict[int, str] = {}
+    for _ in range(args.games):
+        fen = pyffish.start_fen(VARIANT)
+        while True:
+            extra, missing = cross_check(fen)
+            positions += 1
+            if extra or missing:
+                print(f"Mismatch in {fen}\n  extra: {sorted(extra)}\n"
+                      f"  missing: {sorted(missing)}")
+                raise SystemExit(1)
+            # The generators agree, so use the faster one to pick a move.
+            moves = legal_moves(fen)
+            if not moves:
+                break
+            move = rng.choice(moves)
+            position = Position(fen)
+            position.push(move)
+            next_fen = pyffish.get_fen(VARIANT, fen, [move])
+            if position.fen() != next_fen:
+                print(f"FEN mismatch after {move}: {position.fen()} != "
+                      f"{next_fen}")
+                raise SystemExit(1)
+
+            # The key updated by push() must match one worked out from
+            # scratch, and different positions must have different keys.
+            if position.key != position.compute_key():
+                print(f"Zobrist key not updated correctly by {move} in {fen}")
+                raise SystemExit(1)
+            placement = " ".join(next_fen.split(' ')[:2])
+            if seen.setdefault(position.key, placement) != placement:
+                print(f"Zobrist collision: {seen[position.key]} and "
+                      f"{placement}")
+                raise SystemExit(1)
+
+            # Taking the move back must restore the position exactly.
+            position.pop()
+            if position.fen() != fen or position.key != \
+                    position.compute_key():
+                print(f"Taking back {move} didn't restore {fen}")
+                raise SystemExit(1)
+            fen = next_fen
+
+            # Stop at the 50 move rule, or games can wander forever.
+            if int(fen.split(' ')[4]) >= 100:
+                break
+    print(f"{positions} positions agree with pyffish. {len(seen)} distinct "
+          f"positions, no Zobrist collisions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,27 @@
 import pyffish
-import piece
-from typing import Type
+import bitboard
+import threading
+import time
+from concurrent.futures import Future
+import calibrate
 import engine
-import pygame
-from piece import Piece, Queen
+import move_cache
+import time_manager
+from piece import Piece, PIECE_LETTERS, PIECES
 
 LEN_SQUARE = 2
 PROMOTION_LENGTH = 5
 
+# The chance that a cached engine move is searched again anyway, so the
+# engine doesn't play the same move every time at limited strength.
+CACHE_SAMPLE_RATE = 0.25
+
+# The game is drawn when the same position is reached this many times.
+REPETITION_LIMIT = 3
+
+# The piece code of an empty square. See piece.PIECE_LETTERS.
+EMPTY = 0
+
 
 def reverse_items(items: list[str]) -> list[str]:
     """
@@ -23,10 +37,12 @@ def reverse_items(items: list[str]) -> list[str]:
 
 
 class Board:
-    def __init__(self) -> None:
-        self.LETTER_TO_PIECE = {'p': piece.Pawn, 'n': piece.Knight,
-                                'r': piece.Rook, 'q': piece.Queen,
-                                'k': piece.King}
+    def __init__(self, game_engine: engine.Engine | None = None) -> None:
+        """
+        :param game_engine: The engine to play against, e.g. one checked out
+         of an EnginePool. If None, start_engine() starts one in the
+         background.
+        """
         self.NUM_TO_FILE: dict[int, str] = {0: 'a', 1: 'b', 2: 'c', 3: 'd',
                                             4: 'e', 5: 'f'}
         self.FILE_TO_NUM: dict[str, int] = {'a': 0, 'b': 1, 'c': 2, 'd': 3,
@@ -36,7 +52,34 @@ class Board:
 
         self.START_FEN: str = pyffish.start_fen(self.VARIANT)
         self.board_fen = self.START_FEN
-        self.board: list[list[Type[piece.Piece] | None]] = []
+        # The current position, updated one move at a time, so rules checks
+        # don't replay the whole game.
+        self.position = bitboard.Position(self.START_FEN)
+        # How many times each position of the game has been reached, keyed
+        # by Zobrist key, to find threefold repetitions.
+        self.key_counts: dict[int, int] = {self.position.key: 1}
+        # The legal moves of every position reached this game, keyed by
+        # Zobrist key, so going back to a position doesn't generate them
+        # again.
+        self.legal_cache: dict[int, list[str]] = {}
+        # One record per move, so unmake_move() can take it back without
+        # rebuilding the board: (start, end, moved piece code, captured
+        # piece code, FEN before the move).
+        self.undo_stack: list[tuple] = []
+        # Rules results for the current position, worked out once per ply
+        # and cleared by clear_ply_cache() when the position changes.
+        # legal_index has the legal moves keyed by the co-ordinates of the
+        # square they start from. None until needed.
+        self.legal_moves: list[str] | None = None
+        self.legal_index: dict[tuple[int, int],
+                               list[tuple[int, int]]] | None = None
+        self.end_game: dict | None = None
+        self.end_game_checked = False
+        # The number of pyffish calls made, to check the caching works.
+        self.pyffish_calls = 0
+        # The piece code of every square, from the users' perspective,
+        # indexed by rank * 6 + file.
+        self.board = bytearray(36)
         self.moves: list[str] = []
 
         self.MAX_FILE = 6
@@ -45,34 +88,205 @@ class Board:
         # 0 = white, 1 = black
         self.user_side: int = 0
         self.turn = True
+        self.fen_to_board(self.START_FEN)
+
+        # The engine is started on a background thread by start_engine(), so
+        # creating a Board doesn't wait for it. engine is None until it is
+        # ready, and engine_ready is set once it is ready (or failed).
+        self.engine: engine.Engine | None = None
+        self.engine_ready = threading.Event()
+        self.engine_thread: threading.Thread | None = None
+        self.engine_error: Exception | None = None
+        # Engine settings. Passed on to the engine once it is ready. Threads
+        # and Hash come from the saved calibration profile, if there is one.
+        self.elo: int = engine.DEFAULT_ELO
+        self.threads: int = engine.DEFAULT_THREADS
+        self.hash_size: int = engine.DEFAULT_HASH
+        profile = calibrate.load_profile()
+        if profile is not None:
+            self.threads = profile['threads']
+            self.hash_size = profile['hash']
+        self.settings_lock = threading.Lock()
+
+        # How long each startup phase took, in seconds.
+        self.created = time.perf_counter()
+        self.startup_times: dict[str, float] = {}
+
+        # The engine search currently running in the background, if any.
+        self.pending_move: Future | None = None
+        # Chooses the engines think time for each move.
+        self.time_manager = time_manager.TimeManager(
+            time_manager.DEFAULT_BASE_TIME)
+        # The clock of a timed game, shared with the engine. None for games
+        # where the engine uses the time manager instead.
+        self.clock: time_manager.Clock | None = None
+
+        if game_engine is not None:
+            self.attach_engine(game_engine)
+
+    def start_engine(self) -> None:
+        """
+        Starts the engine and its UCI handshake on a background thread. Does
+        nothing if it has already been started.
+        """
+        if self.engine_thread is not None or self.engine_ready.is_set():
+            return
+
+        self.engine_thread = threading.Thread(target=self.launch_engine,
+                                              name="engine-startup",
+                                              daemon=True)
+        self.engine_thread.start()
+
+    def launch_engine(self) -> None:
+        """
+        Starts the engine. Runs on the background thread from start_engine().
+        """
+        try:
+            cache = move_cache.MoveCache(sample_rate=CACHE_SAMPLE_RATE)
+            game_engine = engine.Engine(engine.DEFAULT_PATH, cache)
+        except (OSError, engine.EngineError) as error:
+            self.engine_error = error
+            self.engine_ready.set()
+            return
+
+        self.attach_engine(game_engine)
+
+    def attach_engine(self, game_engine: engine.Engine) -> None:
+        """
+        Sets up a started engine to play this board's games.
+        :param game_engine: The engine.
+        """
+        # If the engine is restarted, put it back at the current position.
+        game_engine.on_restart = self.replay_position
+        game_engine.clock = self.clock
+        game_engine.new_game()
+
+        with self.settings_lock:
+            game_engine.change_elo(self.elo)
+            game_engine.set_threads(self.threads)
+            game_engine.set_hash(self.hash_size)
+            self.engine = game_engine
+
+        self.startup_times.update(game_engine.startup_times)
+        self.startup_times['engine_ready'] = time.perf_counter() - \
+            self.created
+        self.engine_ready.set()
+
+    def wait_engine(self, timeout: float | None = None) -> bool:
+        """
+        Waits for the engine to finish starting. Starts it if it hasn't been
+        started yet.
+        :param timeout: The maximum time to wait, in seconds. Waits until the
+         engine is ready if None.
+        :return: True if the engine is ready.
+        """
+        self.start_engine()
+        self.engine_ready.wait(timeout)
+        return self.engine is not None
+
+    def set_clock(self, clock: time_manager.Clock | None) -> None:
+        """
+        Plays the next moves on a clock, or without one.
+        :param clock: The clock, e.g. Clock(60000, 60000, 1000, 1000). A new
+         one is needed for each game. None for untimed moves, where the time
+         manager picks the think time.
+        """
+        self.clock = clock
+        if self.engine is not None:
+            self.engine.clock = clock
+
+    def press_clock(self) -> None:
+        """
+        Presses the clock, if there is one, for the side that is about to
+        move. Called before the move is played.
+        """
+        if self.clock is None:
+            return
+        if self.position.turn == bitboard.WHITE:
+            self.clock.press(time_manager.WHITE)
+        else:
+            self.clock.press(time_manager.BLACK)
+
+    def change_elo(self, elo: int) -> None:
+        """
+        Changes the elo strength of the engine. If the engine hasn't started
+        yet, the elo is set once it has.
+        :param elo: The elo that the engine should play at.
+        """
+        with self.settings_lock:
+            self.elo = elo
+            if self.engine is not None:
+                self.engine.change_elo(elo)
+
+    def change_threads(self, threads: int) -> None:
+        """
+        Changes the number of threads the engine searches with. If the engine
+        hasn't started yet, it is set once it has.
+        :param threads: The number of threads.
+        """
+        with self.settings_lock:
+            self.threads = threads
+            if self.engine is not None:
+                self.engine.set_threads(threads)
 
-        # Start the engine.
-        self.engine = engine.Engine(["fairy-stockfish_x86-64-bmi2"])
-        self.engine.new_game()
+    def change_hash(self, hash_size: int) -> None:
+        """
+        Changes the size of the engines hash table. If the engine hasn't
+        started yet, it is set once it has.
+        :param hash_size: The size in MB.
+        """
+        with self.settings_lock:
+            self.hash_size = hash_size
+            if self.engine is not None:
+                self.engine.set_hash(hash_size)
 
-        # Temp value, will get changed when new_game() is run.
-        self.w = -1
+    def startup_report(self) -> str:
+        """
+        :return: A report of how long each startup phase took, one phase per
+         line, in milliseconds.
+        """
+        lines = []
+        for phase, seconds in self.startup_times.items():
+            lines.append(f"{phase}: {seconds * 1000:.1f} ms")
+        return "\n".join(lines)
 
-    def new_game(self, w: int) -> None:
+    def new_game(self) -> None:
         """
         Starts a new game and resets the internal variables.
-        :param w: The width of each square. Not used in this function,
-        but necessary for Initialising pieces.
         :return:
         """
+        # Let a search from the previous game finish, so its reply isn't
+        # read as part of this game.
+        if self.pending_move is not None:
+            self.pending_move.result()
+            self.pending_move = None
+
         # Reset instance variables.
-        self.board = []
-        self.moves = []
+        self.set_position(self.START_FEN)
 
-        self.w = w
+        if self.engine is not None:
+            self.engine.new_game()
+            self.engine.update(self.START_FEN)
 
-        self.fen_to_board(self.START_FEN)
-        self.engine.new_game()
+    def set_position(self, fen: str) -> None:
+        """
+        Sets the rules state to the position described in the FEN string, as
+        if a game had started there. The moves played so far are thrown
+        away. Doesn't tell the engine.
+        :param fen: The FEN string position to set the board to.
+        """
+        self.board = bytearray(self.MAX_FILE * self.MAX_RANK)
+        self.moves = []
+        self.board_fen = fen
+        self.position = bitboard.Position(fen)
+        self.key_counts = {self.position.key: 1}
+        self.legal_cache = {}
+        self.undo_stack = []
+        self.clear_ply_cache()
+        self.fen_to_board(fen)
 
-        if self.user_side == 0:
-            self.turn = True
-        else:
-            self.turn = False
+        # It is the users turn if the side to move is the users side.
+        self.turn = self.position.turn == self.user_side
 
     def fen_to_board(self, fen: str) -> None:
         """
@@ -90,29 +304,19 @@ class Board:
         else:
             split_fen = reverse_items(split_fen)
 
-        for i in range(self.MAX_FILE):
-            rank_list = []
-            rank = split_fen[i]
-            for item in rank:
-                try:
-                    empty_squares = int(item)
-                    rank_list.extend([None] * empty_squares)
-                except ValueError:
-                    if item.isupper():  # Piece should be white
-                        path = "assets/pieces/white/"
-                    else:  # Piece should be black
-                        path = "assets/pieces/black/"
-
-                    img = pygame.image.load(f"{path}{item}.svg")
-                    # Create an instance of the required piece.
-                    rank_list.append(
-                        self.LETTER_TO_PIECE[item.lower()]
-                        (item, len(rank_list), i, img, self.w))
-
-            self.board.append(rank_list)
+        for i in range(self.MAX_RANK):
+            index = i * self.MAX_FILE
+            for item in split_fen[i]:
+                if item.isdigit():
+                    for _ in range(int(item)):
+                        self.board[index] = EMPTY
+                        index += 1
+                else:
+                    self.board[index] = PIECE_LETTERS.index(item) + 1
+                    index += 1
 
     def move(self, start: tuple[int, int], end: tuple[int, int],
-             engine_promote: str | None = None) -> Type[Piece] | None:
+             engine_promote: str | None = None) -> Piece | None:
         """
         Make a move on the internal board.
         :param start: The co-ordinates of the piece to move.
@@ -125,42 +329,37 @@ class Board:
         s_file, s_rank = start
         e_file, e_rank = end
 
-        piece = self.board[s_rank][s_file]
-        captured = self.board[e_rank][e_file]
+        start_index = s_rank * self.MAX_FILE + s_file
+        end_index = e_rank * self.MAX_FILE + e_file
+        code = self.board[start_index]
+        captured = self.board[end_index]
 
         # Check for promotion
-        if (self.turn and s_rank == 4 and piece.letter.lower() == 'p') \
-                or engine_promote:
+        if (self.turn and s_rank == 4 and
+                PIECE_LETTERS[code - 1].lower() == 'p') or engine_promote:
 
             promote = True
             is_white = not bool(self.user_side)
 
             if engine_promote:
                 if is_white:
-                    side = "black"
                     letter = engine_promote.lower()
                 else:
-                    side = "white"
                     letter = engine_promote.upper()
 
             elif is_white:
                 letter = 'Q'
-                side = "white"
             else:
                 letter = 'q'
-                side = "black"
-
-            img = pygame.image.load(f"assets/pieces/{side}/{letter}.svg")
 
             # Make move on board.
-            self.board[s_rank][s_file], self.board[e_rank][e_file] = None, \
-                self.LETTER_TO_PIECE[letter.lower()](
-                    letter, e_file, e_rank, img, self.w)
+            self.board[start_index] = EMPTY
+            self.board[end_index] = PIECE_LETTERS.index(letter) + 1
 
         else:  # No promotion
             promote = False
-            self.board[s_rank][s_file], self.board[e_rank][
-                e_file] = None, piece
+            self.board[start_index] = EMPTY
+            self.board[end_index] = code
 
         if self.turn:
             # Convert moves to LAN and append to self.moves.
@@ -177,24 +376,79 @@ class Board:
 
             self.moves.append(move)
 
-        # Update board FEN based on current moves.
-        self.board_fen = pyffish.get_fen(self.VARIANT, self.START_FEN,
-                                         self.moves)
-        self.engine.update(self.board_fen)
+        self.press_clock()
+        self.undo_stack.append((start, end, code, captured, self.board_fen))
+
+        # Update the position with the move.
+        self.position.push(self.moves[-1])
+        self.board_fen = self.position.fen()
+        self.count_position()
+        self.clear_ply_cache()
+        if self.engine is not None:
+            self.engine.update(self.board_fen, self.moves[-1])
 
         # Switch sides
         self.turn = not self.turn
-        return captured
+        return PIECES[captured]
 
     def engine_move(self) -> tuple[tuple[int, int], tuple[int, int]]:
         """
         Gets the best move from the engine. Calls self.move() to make the move
-        on the board.
+        on the board. Blocks until the engine has finished its search.
         :return: Returns a tuple containing the co-ordinates of the start and
         end squares.
         """
-        best_move = self.engine.get_move()
+        self.start_engine_move()
+        best_move = self.pending_move.result()
+        self.pending_move = None
+        return self.apply_engine_move(best_move)
 
+    def start_engine_move(self) -> None:
+        """
+        Starts the engine searching for its next move in the background. Does
+        nothing if a search is already running. Use poll_engine_move() to
+        apply the reply once it arrives.
+        """
+        if self.pending_move is not None:
+            return
+
+        legal_moves = self.board_valid_moves()
+        if len(legal_moves) == 1:
+            # Only one legal move, so there is nothing for the engine to
+            # think about.
+            self.engine.halt_async()
+            self.engine.ponder_move = None
+            self.pending_move = Future()
+            self.pending_move.set_result(legal_moves[0])
+            return
+
+        if self.engine.clock is None:
+            self.engine.move_time = self.time_manager.think_time(
+                self.board_fen, legal_moves, self.engine.elo)
+        self.pending_move = self.engine.get_move_async()
+
+    def poll_engine_move(self) -> tuple[tuple[int, int], tuple[int, int]] \
+            | None:
+        """
+        Applies the engines reply if the background search has finished.
+        :return: The co-ordinates of the start and end squares if the move was
+         made. None if the engine is still thinking, or no search was started.
+        """
+        if self.pending_move is None or not self.pending_move.done():
+            return None
+
+        best_move = self.pending_move.result()
+        self.pending_move = None
+        return self.apply_engine_move(best_move)
+
+    def apply_engine_move(self, best_move: str) \
+            -> tuple[tuple[int, int], tuple[int, int]]:
+        """
+        Makes a move given by the engine on the board.
+        :param best_move: The engines move in LAN.
+        :return: Returns a tuple containing the co-ordinates of the start and
+        end squares.
+        """
         if len(best_move) == PROMOTION_LENGTH:
             promo_piece = best_move[-1]
         else:
@@ -213,8 +467,100 @@ class Board:
             end_coords = self.switch_side(end_coords)
 
         self.move(start_coords, end_coords, promo_piece)
+
+        # Think about the users reply while they do.
+        self.engine.start_ponder(self.board_fen)
         return start_coords, end_coords
 
+    def push_move(self, move: str) -> None:
+        """
+        Plays a move for whichever side is to move. Unlike move(), doesn't
+        tell the engine. Used for games with no display, e.g.
+        engine-vs-engine games, and for perft, where only the rules are
+        needed.
+        :param move: The move in LAN.
+        """
+        start = self.square_to_coords(move[:LEN_SQUARE])
+        end = self.square_to_coords(move[LEN_SQUARE:LEN_SQUARE * 2])
+        if self.user_side == 1:
+            start = self.switch_side(start)
+            end = self.switch_side(end)
+
+        start_index = start[1] * self.MAX_FILE + start[0]
+        end_index = end[1] * self.MAX_FILE + end[0]
+        code = self.board[start_index]
+        self.undo_stack.append((start, end, code, self.board[end_index],
+                                self.board_fen))
+
+        if len(move) == PROMOTION_LENGTH:
+            if self.position.turn == bitboard.WHITE:
+                letter = move[-1].upper()
+            else:
+                letter = move[-1].lower()
+            code = PIECE_LETTERS.index(letter) + 1
+        self.board[start_index] = EMPTY
+        self.board[end_index] = code
+
+        self.press_clock()
+        self.moves.append(move)
+        self.position.push(move)
+        self.board_fen = self.position.fen()
+        self.count_position()
+        self.clear_ply_cache()
+        self.turn = not self.turn
+
+    def unmake_move(self) -> str:
+        """
+        Takes back the last move in constant time. The moved and captured
+        pieces are put back, and the position, FEN and turn are restored
+        from the undo records without calling pyffish. Doesn't tell the
+        engine, or wind back the clock. See takeback().
+        :return: The move taken back, in LAN.
+        """
+        start, end, moved, captured, previous_fen = self.undo_stack.pop()
+        s_file, s_rank = start
+        e_file, e_rank = end
+        self.board[s_rank * self.MAX_FILE + s_file] = moved
+        self.board[e_rank * self.MAX_FILE + e_file] = captured
+
+        key = self.position.key
+        self.key_counts[key] -= 1
+        if not self.key_counts[key]:
+            del self.key_counts[key]
+
+        self.position.pop()
+        self.board_fen = previous_fen
+        self.clear_ply_cache()
+        self.turn = not self.turn
+        return self.moves.pop()
+
+    def takeback(self) -> bool:
+        """
+        Takes back the users last move and the engines reply to it, so it is
+        the users turn again. A search that is still running is waited for
+        and its move thrown away.
+        :return: True if any move was taken back.
+        """
+        if self.pending_move is not None:
+            self.pending_move.result()
+            self.pending_move = None
+        if not self.undo_stack:
+            return False
+
+        self.unmake_move()
+        while not self.turn and self.undo_stack:
+            self.unmake_move()
+
+        if self.engine is not None:
+            self.engine.update(self.board_fen)
+        return True
+
+    def replay_position(self) -> None:
+        """
+        Sets the engines position by replaying the moves of the game.
+        """
+        self.engine.replay(self.START_FEN, self.moves)
+
     def switch_side(self, move: tuple[int, int]) -> tuple[int, int]:
         """
         Returns the co-ordinates of the square given from the opponents'
@@ -230,7 +576,7 @@ class Board:
 
         return new_file, new_rank
 
-    def on_square(self, file: int, rank: int) -> Type[piece.Piece] | None:
+    def on_square(self, file: int, rank: int) -> Piece | None:
         """
         Checks whether a square (given by file and rank) is occupied by a
         piece. Returns the piece instance, if there is a piece on the square.
@@ -246,7 +592,7 @@ class Board:
                              f"and 5 (inclusive). \n"
                              f"File: {file}, Rank: {rank}")
 
-        return self.board[rank][file]
+        return PIECES[self.board[rank * self.MAX_FILE + file]]
 
     def coords_to_square(self, file: int, rank: int) -> str:
         """
@@ -281,15 +627,75 @@ class Board:
     def board_valid_moves(self) -> list[str]:
         """
         Gets all the valid moves on the board for the current players turn.
+        Worked out once per ply.
         :return: Returns a list of all valid moves, given in LAN.
         """
+        if self.legal_moves is None:
+            key = self.position.key
+            if key not in self.legal_cache:
+                self.legal_cache[key] = self.position.legal_moves()
+            self.legal_moves = self.legal_cache[key]
+        return self.legal_moves
+
+    def count_position(self) -> None:
+        """
+        Records that the current position has been reached again, for
+        repetition detection.
+        """
+        key = self.position.key
+        self.key_counts[key] = self.key_counts.get(key, 0) + 1
+
+    def clear_ply_cache(self) -> None:
+        """
+        Throws away the rules results cached for the previous position.
+        Called whenever a move is made or a new game starts.
+        """
+        self.legal_moves = None
+        self.legal_index = None
+        self.end_game = None
+        self.end_game_checked = False
 
-        return pyffish.legal_moves(self.VARIANT, self.START_FEN, self.moves)
+    def legal_moves_from(self, square: tuple[int, int]) \
+            -> list[tuple[int, int]]:
+        """
+        Gets the squares the piece on a square can legally move to. The legal
+        moves are worked out once per ply, so this is a dictionary lookup.
+        :param square: The co-ordinates of the square, from the users'
+         perspective.
+        :return: The co-ordinates of the squares the piece can move to, from
+         the users' perspective. Promotions are only listed once.
+        """
+        if self.legal_index is None:
+            index = {}
+            for move in self.board_valid_moves():
+                start = self.square_to_coords(move[:LEN_SQUARE])
+                end = self.square_to_coords(
+                    move[LEN_SQUARE:LEN_SQUARE * 2])
+                if self.user_side == 1:
+                    start = self.switch_side(start)
+                    end = self.switch_side(end)
+
+                targets = index.setdefault(start, [])
+                if end not in targets:
+                    targets.append(end)
+            self.legal_index = index
+
+        return self.legal_index.get(square, [])
 
     def check_end_game(self) -> dict | None:
         """
-        Checks for Checkmate and Stalemate. Can also put timeout into this
-        function?
+        Checks whether the game has ended. The result is worked out once per
+        move, so this can be called every frame.
+        :return: The result of find_end_game().
+        """
+        if not self.end_game_checked:
+            self.end_game = self.find_end_game()
+            self.end_game_checked = True
+        return self.end_game
+
+    def find_end_game(self) -> dict | None:
+        """
+        Checks for a loss on time, Checkmate, Stalemate and draws.
         :return: Returns a dict with keys `result` and `reason`. `result` is
          an integer, where -1 means draw, 0 means white wins, and 1 means
          black wins. `reason` is the reason for the result (i.e. Checkmate,
@@ -300,7 +706,17 @@ class Board:
         BLACK_WIN = 1
         return_dict = {}
 
+        # Loss on time. The clock is checked when it is pressed, so a flag
+        # is seen after the move that used up the time.
+        flagged = self.clock.flagged() if self.clock is not None else None
+        if flagged is not None:
+            return_dict['result'] = BLACK_WIN \
+                if flagged == time_manager.WHITE else WHITE_WIN
+            return_dict['reason'] = "On Time"
+            return return_dict
+
         # Draw by insufficient material
+        self.pyffish_calls += 1
         insufficient_mat = pyffish.has_insufficient_material(self.VARIANT,
                                                              self.board_fen,
                                                              [])
@@ -309,8 +725,7 @@ class Board:
             return_dict['reason'] = "By Insufficient Material"
             return return_dict
 
-        gives_check = pyffish.gives_check(self.VARIANT, self.START_FEN,
-                                          self.moves)
+        gives_check = self.position.is_check()
         # Stalemate
         if len(self.board_valid_moves()) == 0 and not gives_check:
             return_dict["result"] = DRAW
@@ -329,6 +744,12 @@ class Board:
                 return_dict['result'] = WHITE_WIN
 
             return return_dict
+
+        # Threefold repetition
+        if self.key_counts.get(self.position.key, 0) >= REPETITION_LIMIT:
+            return_dict['result'] = DRAW
+            return_dict['reason'] = "By Threefold Repetition"
+            return return_dict
         return None
 
     def print_board(self):
@@ -337,12 +758,13 @@ class Board:
         zeroes. Only for testing purposes.
         :return:
         """
-        for rank in self.board:
+        for rank in range(self.MAX_RANK):
             txt = ""
-            for file in rank:
-                if file is None:
+            for file in range(self.MAX_FILE):
+                code = self.board[rank * self.MAX_FILE + file]
+                if code == EMPTY:
                     txt += "0 "
                 else:
-                    txt += f"{file.letter} "
+                    txt += f"{PIECE_LETTERS[code - 1]} "
             print(txt)
         print()
@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+
+import engine
+from engine import Engine
+
+# Where the chosen Threads/Hash settings are saved.
+PROFILE_PATH = "engine_profile.json"
+
+# More threads are only used if they search at least this much faster.
+MIN_THREAD_GAIN = 1.1
+
+# The hash table is doubled while the timed searches fill more than this
+# share of it (given per mille, like the engines `hashfull`), up to MAX_HASH.
+HASHFULL_TARGET = 500
+MAX_HASH = 1024
+
+# Timed searches run from the start position after the benchmark.
+TIMED_SEARCHES = 3
+TIMED_MOVE_TIME = 1000
+
+
+def thread_candidates(cores: int) -> list[int]:
+    """
+    :param cores: The number of cores available to one engine.
+    :return: 1, 2, 4, ... up to the number of cores, plus the number of
+     cores itself.
+    """
+    candidates = []
+    threads = 1
+    while threads < cores:
+        candidates.append(threads)
+        threads *= 2
+    candidates.append(cores)
+    return candidates
+
+
+def timed_searches(test_engine: Engine, searches: int = TIMED_SEARCHES,
+                   move_time: int = TIMED_MOVE_TIME) -> dict:
+    """
+    Runs a few normal searches from the start position and averages the
+    metrics the engine reports.
+    :param test_engine: The engine to test.
+    :param searches: The number of searches.
+    :param move_time: The move time of each search, in milliseconds.
+    :return: The averaged metrics. See EngineMetrics.summary().
+    """
+    test_engine.new_game()
+    test_engine.move_time = move_time
+    test_engine.metrics.records.clear()
+    for _ in range(searches):
+        test_engine.search()
+    return test_engine.metrics.summary()
+
+
+def calibrate(path: list | None = None, pool_size: int = 1) -> dict:
+    """
+    Picks the Threads and Hash settings for this machine. Each thread count
+    up to the number of cores (shared between the pool members) is run
+    through the engines `bench`, and the fastest is chosen, preferring
+    fewer threads unless more are clearly faster. The hash table is then
+    grown until timed searches no longer fill most of it.
+    :param path: The command used to start the engine. Defaults to
+     engine.DEFAULT_PATH.
+    :param pool_size: The number of engines that will run at once.
+    :return: The profile, a dict with keys `threads`, `hash`, `nps` and
+     `pool_size`.
+    """
+    path = engine.DEFAULT_PATH if path is None else path
+    cores = max((os.cpu_count() or 1) // pool_size, 1)
+
+    test_engine = Engine(path)
+    try:
+        # Measure raw speed, not the weakened search.
+        test_engine.set_option("UCI_LimitStrength", "false")
+        test_engine.set_option("Ponder", "false")
+        test_engine.new_game()
+
+        best_threads = 1
+        best_nps = 0
+        for threads in thread_candidates(cores):
+            test_engine.set_threads(threads)
+            nps = test_engine.bench()
+            if nps > best_nps * MIN_THREAD_GAIN:
+                best_threads = threads
+                best_nps = nps
+        test_engine.set_threads(best_threads)
+
+        hash_size = engine.DEFAULT_HASH
+        test_engine.set_hash(hash_size)
+        while hash_size < MAX_HASH:
+            hashfull = timed_searches(test_engine).get("average_hashfull")
+            if hashfull is None or hashfull <= HASHFULL_TARGET:
+                break
+            hash_size *= 2
+            test_engine.set_hash(hash_size)
+    finally:
+        test_engine.quit()
+
+    return {'threads': best_threads, 'hash': hash_size, 'nps': best_nps,
+            'pool_size': pool_size}
+
+
+def load_profile(pool_size: int = 1, path: str = PROFILE_PATH) \
+        -> dict | None:
+    """
+    Loads a saved profile.
+    :param pool_size: The number of engines that will run at once.
+    :param path: The profile file.
+    :return: The profile for the pool size, or None if there isn't one.
+    """
+    try:
+        with open(path) as file:
+            profiles = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return profiles.get(str(pool_size))
+
+
+def save_profile(profile: dict, path: str = PROFILE_PATH) -> None:
+    """
+    Saves a profile, keeping the saved profiles for other pool sizes.
+    :param profile: The result of calibrate().
+    :param path: The profile file.
+    """
+    try:
+        with open(path) as file:
+            profiles = json.load(file)
+    except (OSError, ValueError):
+        profiles = {}
+
+    profiles[str(profile['pool_size'])] = profile
+    with open(path, "w") as file:
+        json.dump(profiles, file, indent=2)
+
+
+def apply_profile(target: Engine, profile: dict | None) -> None:
+    """
+    Sets an engines Threads and Hash from a profile.
+    :param target: The engine.
+    :param profile: The profile. Nothing is changed if None.
+    """
+    if profile is None:
+        return
+    target.set_threads(profile['threads'])
+    target.set_hash(profile['hash'])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Pick Threads/Hash settings for Fairy-Stockfish on this "
+                    "machine and save them.")
+    parser.add_argument("--pool-size", type=int, default=1,
+                        help="the number of engines that will run at once")
+    args = parser.parse_args()
+
+    profile = calibrate(pool_size=args.pool_size)
+    save_profile(profile)
+    print(f"Threads: {profile['threads']}, Hash: {profile['hash']} MB, "
+          f"{profile['nps']} nodes/second")
+
+
+if __name__ == "__main__":
+    main()
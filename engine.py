@@ -1,39 +1,347 @@
 import subprocess
 import threading
-from typing import Generator, Any
+import queue
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, TypeVar
 import os
+import shlex
+from metrics import EngineMetrics, parse_info
+from move_cache import MoveCache
+from time_manager import Clock
 
 # https://github.com/fairy-stockfish/FairyFishGUI/blob/main/fairyfishgui.py
 # Note: Engine knows which side to calculate for using FEN.
 
 BEST_MOVE_POS = 1
+PONDER_MOVE_POS = 3
+
+# The command used to start Fairy-Stockfish. Can be replaced by setting the
+# ENGINE_ENV_VAR environment variable, e.g. to run mock_engine.py instead.
+ENGINE_ENV_VAR = "LOS_ALAMOS_ENGINE"
+DEFAULT_PATH = ["fairy-stockfish_x86-64-bmi2"]
+if os.environ.get(ENGINE_ENV_VAR):
+    DEFAULT_PATH = shlex.split(os.environ[ENGINE_ENV_VAR])
+DEFAULT_ELO = 800
+# Fairy-Stockfish's defaults for the Threads and Hash (in MB) options.
+DEFAULT_THREADS = 1
+DEFAULT_HASH = 16
+# The think time of a search, in milliseconds, unless a game sets its own.
+DEFAULT_MOVE_TIME = 1500
+
+# Types of message the reader thread sorts the engines output into.
+BESTMOVE = "bestmove"
+INFO = "info"
+READYOK = "readyok"
+UCIOK = "uciok"
+BOARD = "board"
+BENCH = "bench"
+OTHER = "other"
+MESSAGE_TYPES = (BESTMOVE, INFO, READYOK, UCIOK, BOARD, BENCH, OTHER)
+
+# `info` and unrecognised lines are rarely waited on, so only
+# the most recent ones are kept. 0 means the queue is unbounded.
+QUEUE_SIZES = {INFO: 1000, OTHER: 1000}
+
+# The board printed by the `d` command starts with the top border of the
+# board and ends with the line listing the pieces giving check.
+BOARD_DUMP_START = " +---"
+BOARD_DUMP_END = "Checkers:"
+
+# The last line of the `bench` summary, e.g. 'Nodes/second    : 123456'.
+BENCH_RESULT = "Nodes/second"
+# The depth each `bench` position is searched to, and how long to wait for
+# the whole benchmark, in seconds.
+BENCH_DEPTH = 10
+BENCH_TIMEOUT: float = 300
+
+# Analysis budget: the most lines and the longest search (in milliseconds)
+# one analysis may ask for, so it can't tie up an engine for long.
+DEFAULT_ANALYSIS_LINES = 3
+MAX_ANALYSIS_LINES = 8
+MAX_ANALYSIS_TIME = 5000
+
+# How long to wait for a reply from the engine, in seconds.
+DEFAULT_TIMEOUT: float = 10
+# Extra time given on top of the move time before giving up on a search.
+SEARCH_TIMEOUT_MARGIN: float = 5
+MS_PER_SECOND = 1000
+# How often a waiting request checks whether the engine has crashed.
+CRASH_CHECK_INTERVAL: float = 0.1
+# How many times a request is retried on a restarted engine before giving up.
+MAX_RETRIES = 2
+
+T = TypeVar("T")
+
+
+class EngineError(Exception):
+    """
+    The engine stopped responding or exited.
+    """
+
+
+class EngineCrashed(EngineError):
+    """
+    The engine process exited.
+    """
+
+
+class EngineTimeout(EngineError, TimeoutError):
+    """
+    The engine didn't reply before the request's deadline.
+    """
+
+
+def message_type(line: str) -> str:
+    """
+    Works out which type of message a line of engine output is.
+    :param line: The line of output, without the trailing newline.
+    :return: One of the message types in MESSAGE_TYPES. Board dump lines are
+     returned as OTHER, as they can only be recognised by their position.
+    """
+    first_word = line.split(" ", 1)[0]
+    if first_word in (BESTMOVE, INFO, READYOK, UCIOK):
+        return first_word
+    if line.startswith(BENCH_RESULT):
+        return BENCH
+    return OTHER
 
 
 class Engine:
-    def __init__(self, path: list) -> None:
+    def __init__(self, path: list, cache: MoveCache | None = None) -> None:
         """
-        Initialise the engine.
+        Initialise the engine. Starts the engine process and waits for the
+        UCI handshake, so this can take a while. Construct it on a background
+        thread to avoid blocking the GUI.
         :param path: The path to the .exe file of the engine.
+        :param cache: An optional cache of best moves, checked before
+         searching.
         """
 
-        self.process = subprocess.Popen(path,
+        self.path = path
+        self.lock = threading.Lock()
+
+        # Per-search records built from the engines info lines.
+        self.metrics = EngineMetrics()
+
+        # UCI options that have been set, so a restarted engine can be given
+        # them again.
+        self.options: dict[str, str] = {}
+
+        # Watchdog: a hung or crashed engine is restarted and the request
+        # retried. on_restart, if set, restores the position afterwards
+        # (e.g. by replaying the games moves). Otherwise the last FEN given
+        # to update() is sent again.
+        self.on_restart: Callable[[], None] | None = None
+        # Set when a command sent outside a supervised request finds the
+        # engine has exited, so the next supervised request restarts it
+        # first instead of the caller seeing the crash.
+        self.needs_restart = False
+        self.restarts: int = 0
+        self.recovery_times: list[float] = []
+
+        self.process: subprocess.Popen | None = None
+        self.queues: dict[str, queue.Queue] = {}
+        self.reader: threading.Thread | None = None
+        # How long each startup phase took, in seconds.
+        self.startup_times: dict[str, float] = {}
+
+        # Searches run on a single worker thread so the GUI can keep
+        # rendering while the engine thinks. One worker also means searches
+        # never overlap on the engine's stdout.
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix="engine",
+                                           initializer=self.set_worker)
+        self.worker: threading.Thread | None = None
+        # A ponder search being stopped on the worker thread, after update()
+        # found the user didn't play the expected reply. Commands from other
+        # threads wait for it, so they don't reach the engine mid-search.
+        self.stopping: Future | None = None
+
+        self.DEFAULT_ELO: int = DEFAULT_ELO
+        self.elo = self.DEFAULT_ELO
+        # The number of search threads, and the hash table size in MB.
+        self.threads: int = DEFAULT_THREADS
+        self.hash_size: int = DEFAULT_HASH
+        self.moves = []
+
+        self.cache = cache
+        # The FEN of the position the engine was last given, used as the cache
+        # key. None if it isn't known, e.g. after `position startpos`.
+        self.fen: str | None = None
+
+        # The amount of time for the engine to think. Given in milliseconds.
+        self.move_time: int = DEFAULT_MOVE_TIME
+        # If set, searches use the clock times instead of move_time.
+        self.clock: Clock | None = None
+
+        # Pondering: while the user thinks, the engine searches the reply it
+        # expects them to make. `ponder_move` is the expected reply from the
+        # last bestmove, `ponder_hit` is set when the user played it.
+        self.ponder: bool = True
+        self.pondering: bool = False
+        self.ponder_move: str | None = None
+        self.ponder_hit: bool = False
+        # When the running ponder search started, from time.perf_counter().
+        self.ponder_start: float = 0.0
+        self.ponder_hits: int = 0
+        self.ponder_misses: int = 0
+        # How long each reply took, in seconds, split by whether it came
+        # from a ponder hit or a normal search.
+        self.hit_reply_times: list[float] = []
+        self.search_reply_times: list[float] = []
+
+        # Sent to the engine once it has replied with uciok.
+        self.options["UCI_LimitStrength"] = "true"
+        self.options["Ponder"] = "true"
+        self.options["UCI_Elo"] = str(self.DEFAULT_ELO)
+
+        self.launch()
+        self.handshake()
+
+    def launch(self) -> None:
+        """
+        Starts the engine process and the thread that reads its output, and
+        sends `uci`.
+        """
+        start = time.perf_counter()
+        # The `bench` summary is written to stderr, so read both.
+        self.process = subprocess.Popen(self.path,
                                         stdin=subprocess.PIPE,
                                         stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT,
                                         universal_newlines=True)
-        self.lock = threading.Lock()
+
+        # One queue per message type. The reader thread fills these, and
+        # anything waiting for a reply only looks at the queue it needs.
+        self.queues = {kind: queue.Queue(QUEUE_SIZES.get(kind, 0))
+                       for kind in MESSAGE_TYPES}
+
+        # Drain stdout continuously so the pipe buffer never fills up.
+        self.reader = threading.Thread(target=self.read_loop,
+                                       args=(self.process,),
+                                       name="engine-reader", daemon=True)
+        self.reader.start()
 
         # Initialise the engine.
         self.write('uci\n')
+        self.startup_times['spawn'] = time.perf_counter() - start
 
-        self.DEFAULT_ELO: int = 800
-        self.elo = self.DEFAULT_ELO
-        self.moves = []
+    def handshake(self) -> None:
+        """
+        Waits for the engine to finish starting up (`uciok`), sends it every
+        recorded UCI option, and waits until it has applied them (`readyok`).
+        :raises EngineError: If the engine doesn't reply in time or exits.
+        """
+        start = time.perf_counter()
+        self.wait_for(UCIOK)
+        uciok = time.perf_counter()
+        self.startup_times['uciok'] = uciok - start
 
-        # The amount of time for the engine to think. Given in milliseconds.
-        self.move_time: int = 1500
+        for name, value in self.options.items():
+            self.write(f"setoption name {name} value {value}\n")
+        options = time.perf_counter()
+        self.startup_times['options'] = options - uciok
 
-        self.write("setoption name UCI_LimitStrength value true\n")
-        self.change_elo(self.DEFAULT_ELO)
+        self.clear(READYOK)
+        self.write("isready\n")
+        self.wait_for(READYOK)
+        self.startup_times['readyok'] = time.perf_counter() - options
+
+    def restart(self) -> None:
+        """
+        Kills the engine and starts a new one in the same state: the same
+        UCI options, and the current position.
+        """
+        start = time.perf_counter()
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+        self.pondering = False
+        self.ponder_hit = False
+        self.needs_restart = False
+        self.metrics.abandon()
+
+        self.launch()
+        self.handshake()
+
+        if self.on_restart is not None:
+            self.on_restart()
+        elif self.fen is not None:
+            self.write(f"position fen {self.fen}\n")
+        if self.needs_restart:
+            raise EngineCrashed("The engine exited while restarting.")
+
+        self.restarts += 1
+        self.recovery_times.append(time.perf_counter() - start)
+
+    def supervised(self, request: Callable[[], T]) -> T:
+        """
+        Runs a request, restarting the engine and retrying if it hangs or
+        crashes.
+        :param request: The function that sends the request and waits for
+         the reply.
+        :return: The result of the request.
+        """
+        self.wait_stopped()
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                if self.needs_restart:
+                    self.restart()
+                return request()
+            except EngineError:
+                if attempt == MAX_RETRIES:
+                    raise
+                self.restart()
+
+    def watchdog_stats(self) -> dict:
+        """
+        :return: Returns a dict with keys `restarts`, `average_recovery` and
+         `max_recovery` (in seconds, None if there were no restarts).
+        """
+        times = self.recovery_times
+        return {'restarts': self.restarts,
+                'average_recovery': sum(times) / len(times) if times
+                else None,
+                'max_recovery': max(times) if times else None}
+
+    def set_option(self, name: str, value) -> None:
+        """
+        Sets a UCI option. The option is set again if the engine restarts.
+        :param name: The name of the option.
+        :param value: The value of the option.
+        """
+        self.options[name] = str(value)
+        self.send(f"setoption name {name} value {value}\n")
+
+    def replay(self, start_fen: str, moves: list[str]) -> None:
+        """
+        Sets the engines position by playing moves from a start position.
+        :param start_fen: The FEN of the start position.
+        :param moves: The moves played, in LAN.
+        """
+        if moves:
+            self.send(f"position fen {start_fen} moves {' '.join(moves)}\n")
+        else:
+            self.send(f"position fen {start_fen}\n")
+
+    def set_worker(self) -> None:
+        """
+        Records the worker thread. Runs on the worker thread when it starts.
+        """
+        self.worker = threading.current_thread()
+
+    def wait_stopped(self) -> None:
+        """
+        Waits for a ponder search that is being stopped in the background.
+        Does nothing on the worker thread, which has already stopped it by
+        the time it runs anything else.
+        """
+        stopping = self.stopping
+        if stopping is not None and \
+                threading.current_thread() is not self.worker:
+            stopping.result()
 
     def write(self, message: str) -> None:
         """
@@ -41,19 +349,104 @@ class Engine:
         :param message: The command to send.
         :return:
         """
+        self.wait_stopped()
         with self.lock:
-            self.process.stdin.write(message)
-            self.process.stdin.flush()
+            try:
+                self.process.stdin.write(message)
+                self.process.stdin.flush()
+            except OSError as error:
+                raise EngineCrashed("The engine has exited.") from error
 
-    def read(self) -> Generator[str, Any, None]:
+    def send(self, message: str) -> None:
         """
-        Reads responses from the engine. This function should not be used, as
-        it is a generator, it will continue to respond with lines from the
-        engine. Instead, use response().
-        :return: Will continue to output lines from the engine.
+        Writes a command that isn't part of a supervised request, e.g. a new
+        position. If the engine has exited, it is marked for a restart
+        instead of raising, and the next supervised request (e.g. the next
+        search) restarts it and restores its options and position.
+        :param message: The command to send.
         """
-        while self.process.poll() is None:
-            yield self.process.stdout.readline()
+        try:
+            self.write(message)
+        except EngineCrashed:
+            self.needs_restart = True
+
+    def read_loop(self, process: subprocess.Popen) -> None:
+        """
+        Reads every line the engine outputs and puts it on the queue for its
+        message type. Runs on the reader thread until the engine exits. Lines
+        from a `d` board dump are joined and queued as one BOARD message.
+        :param process: The engine process to read from. The loop stops if
+         the engine is restarted.
+        """
+        dump: list[str] = []
+        for line in process.stdout:
+            if process is not self.process:
+                return
+            line = line.rstrip("\n")
+
+            if line.startswith(BOARD_DUMP_START) or dump:
+                dump.append(line)
+                if line.startswith(BOARD_DUMP_END):
+                    self.put(BOARD, "\n".join(dump))
+                    dump = []
+            else:
+                kind = message_type(line)
+                if kind == INFO:
+                    self.metrics.on_info(parse_info(line))
+                self.put(kind, line)
+
+    def put(self, kind: str, message: str) -> None:
+        """
+        Adds a message to the queue for its type. If the queue is full, the
+        oldest message is dropped to make room.
+        :param kind: The message type.
+        :param message: The message to add.
+        """
+        messages = self.queues[kind]
+        while True:
+            try:
+                messages.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    messages.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def wait_for(self, kind: str, timeout: float = DEFAULT_TIMEOUT) -> str:
+        """
+        Waits for the next message of a given type from the engine.
+        :param kind: The message type to wait for. One of MESSAGE_TYPES.
+        :param timeout: The maximum time to wait, in seconds.
+        :return: The message.
+        :raises EngineTimeout: If no message arrived before the timeout.
+        :raises EngineCrashed: If the engine exited while waiting.
+        """
+        messages = self.queues[kind]
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise EngineTimeout(f"Engine did not reply with {kind}.")
+            try:
+                return messages.get(timeout=min(remaining,
+                                                CRASH_CHECK_INTERVAL))
+            except queue.Empty:
+                if self.process.poll() is not None and messages.empty():
+                    raise EngineCrashed("The engine has exited.")
+
+    def clear(self, kind: str) -> None:
+        """
+        Throws away any messages of a type that nothing has waited for yet,
+        so stale replies aren't mistaken for the reply to a new request.
+        :param kind: The message type to clear.
+        """
+        messages = self.queues[kind]
+        while True:
+            try:
+                messages.get_nowait()
+            except queue.Empty:
+                return
 
     def new_game(self) -> None:
         """
@@ -61,21 +454,58 @@ class Engine:
         sets the position to the starting position and sets engine elo to
         default.
         """
+        self.stop_ponder()
+        self.ponder_move = None
+        self.fen = None
+
+        self.send("ucinewgame\n")
+
+        self.set_option("UCI_Variant", "losalamos")
+        self.send(f"position startpos\n")
 
-        self.write("ucinewgame\n")
+    def reset(self, elo: int | None = None) -> bool:
+        """
+        Puts the engine back into a clean state for a new game, so it can be
+        handed from one game to the next.
+        :param elo: The elo to play at. Uses the default elo if None.
+        :return: Returns True if the engine is ready afterwards.
+        """
+        # Settings from the last game it was used for.
+        self.on_restart = None
+        self.clock = None
+        self.move_time = DEFAULT_MOVE_TIME
+        self.new_game()
+        self.change_elo(self.DEFAULT_ELO if elo is None else elo)
+        return self.is_ready()
 
-        self.write("setoption name UCI_Variant value losalamos\n")
-        self.write(f"position startpos\n")
+    def quit(self) -> None:
+        """
+        Stops the engine process and the worker thread.
+        """
+        self.executor.shutdown(wait=True)
+        if self.process.poll() is None:
+            self.send("quit\n")
+            try:
+                self.process.wait(DEFAULT_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                # A hung engine doesn't read `quit`.
+                self.process.kill()
+                self.process.wait()
 
     def is_ready(self) -> bool:
         """
         Sends the isready command to the engine.
         :return: Returns True if the engine is ready. Returns False otherwise.
         """
-        self.write("isready\n")
-        if self.response("readyok"):
+        def request() -> str:
+            self.clear(READYOK)
+            self.write("isready\n")
+            return self.wait_for(READYOK)
+
+        try:
+            self.supervised(request)
             return True
-        else:
+        except EngineError:
             return False
 
     def change_elo(self, elo: int) -> None:
@@ -84,41 +514,372 @@ class Engine:
         :param elo: The elo that the engine should play at. Must be between
          500 and 2850
         """
-        self.write(f"setoption name UCI_Elo value {elo}\n")
+        self.set_option("UCI_Elo", elo)
         self.elo = elo
 
-    # def get_position(self) -> str:
-    #     self.write("d\n")
-    #     line = self.response("Fen: ")
-    #     return line.split(" ", 1)[1]
+    def set_threads(self, threads: int) -> None:
+        """
+        Changes the number of threads the engine searches with.
+        :param threads: The number of threads. At least 1.
+        """
+        self.set_option("Threads", threads)
+        self.threads = threads
 
-    def response(self, phrase: str):
+    def set_hash(self, hash_size: int) -> None:
         """
-        Returns a specific line from the engine if it contains the phrase
-        given.
-        :param phrase: The phrase to search for, and return.
-        :return:
+        Changes the size of the engines hash table.
+        :param hash_size: The size in MB.
+        """
+        self.set_option("Hash", hash_size)
+        self.hash_size = hash_size
+
+    def bench(self, depth: int = BENCH_DEPTH) -> int:
+        """
+        Runs the engines built-in benchmark with the current Threads and Hash
+        settings.
+        :param depth: The depth to search each benchmark position to.
+        :return: The nodes searched per second.
         """
-        for line in self.read():
-            # print(line)
-            if phrase in line:
-                return line
+        def request() -> str:
+            self.clear(BENCH)
+            self.write(f"bench {self.hash_size} {self.threads} {depth} "
+                       f"default depth\n")
+            return self.wait_for(BENCH, BENCH_TIMEOUT)
+
+        # The line is in the format 'Nodes/second    : 123456'.
+        return int(self.supervised(request).split(":")[1])
 
-    def update(self, fen: str) -> None:
+    def get_position(self) -> str | None:
         """
-        Update the engines internal board.
+        Asks the engine for the FEN of its internal board.
+        :return: The FEN string, or None if the board dump had no FEN.
+        """
+        def request() -> str:
+            self.clear(BOARD)
+            self.write("d\n")
+            return self.wait_for(BOARD)
+
+        for line in self.supervised(request).split("\n"):
+            if line.startswith("Fen: "):
+                return line.split(" ", 1)[1]
+        return None
+
+    def update(self, fen: str, last_move: str | None = None) -> None:
+        """
+        Update the engines internal board. If the engine is pondering and the
+        last move was the one it expected, it keeps searching and the next
+        get_move() turns the ponder search into the real one.
         :param fen: The FEN string of the current position.
+        :param last_move: The move (in LAN) that led to this position.
         """
-        self.write(f"position fen {fen}")
-        # Need this here to work??? IDK why but the engine freezes without it.
-        self.write('d\n')
+        self.fen = fen
+        if self.pondering:
+            if last_move is not None and last_move == self.ponder_move:
+                self.ponder_hit = True
+                return
+            # Stopping the search waits for its bestmove, which takes until
+            # the timeout if the engine has hung, so it is done on the
+            # worker thread. Searches queue up behind it there.
+            self.stopping = self.executor.submit(self.replace_ponder, fen)
+            return
+
+        self.send(f"position fen {fen}\n")
+
+    def replace_ponder(self, fen: str) -> None:
+        """
+        Stops a ponder search that guessed the wrong reply, then gives the
+        engine the position that was reached. Runs on the worker thread.
+        :param fen: The FEN string of the current position.
+        """
+        self.stop_ponder()
+        self.send(f"position fen {fen}\n")
+
+    def start_ponder(self, fen: str) -> bool:
+        """
+        Starts searching the position after the reply the engine expects,
+        while the user thinks about their move. Should be called right after
+        the engines move has been made.
+        :param fen: The FEN string of the position after the engines move.
+        :return: True if the engine started pondering.
+        """
+        if not self.ponder or self.pondering or self.ponder_move is None \
+                or self.needs_restart:
+            return False
+
+        self.send(f"position fen {fen} moves {self.ponder_move}\n")
+        self.metrics.start_search()
+        self.send(self.go_command(ponder=True))
+        if self.needs_restart:
+            self.metrics.abandon()
+            return False
+        self.pondering = True
+        self.ponder_hit = False
+        self.ponder_start = time.perf_counter()
+        return True
+
+    def stop_ponder(self) -> None:
+        """
+        Stops a ponder search that guessed the wrong reply, and throws away
+        the best move it reports.
+        """
+        self.wait_stopped()
+        if not self.pondering:
+            return
+
+        self.halt()
+        self.ponder_misses += 1
+
+    def halt(self) -> None:
+        """
+        Stops a running ponder search and throws away the best move it
+        reports. Does nothing if the engine isn't pondering.
+        """
+        self.wait_stopped()
+        if not self.pondering:
+            return
+
+        self.clear(BESTMOVE)
+        try:
+            self.write("stop\n")
+            self.wait_for(BESTMOVE)
+        except EngineError:
+            # The engine has hung or exited. The next supervised request
+            # restarts it.
+            self.needs_restart = True
+        self.metrics.abandon()
+        self.pondering = False
+        self.ponder_hit = False
+
+    def ponder_stats(self) -> dict:
+        """
+        Reports how often pondering guessed the users reply and how much time
+        it saved.
+        :return: Returns a dict with keys `hits`, `misses`, `hit_rate`,
+         `average_hit_reply` and `average_search_reply`. Reply times are in
+         seconds, and are None if there were no replies of that kind.
+        """
+        total = self.ponder_hits + self.ponder_misses
+
+        def average(times: list[float]) -> float | None:
+            return sum(times) / len(times) if times else None
+
+        return {'hits': self.ponder_hits,
+                'misses': self.ponder_misses,
+                'hit_rate': self.ponder_hits / total if total else 0.0,
+                'average_hit_reply': average(self.hit_reply_times),
+                'average_search_reply': average(self.search_reply_times)}
+
+    def go_command(self, ponder: bool = False) -> str:
+        """
+        :param ponder: Whether the search is a ponder search.
+        :return: The `go` command for a search, using the clock if there is
+         one and the move time otherwise.
+        """
+        if self.clock is not None:
+            return self.clock.go_command(ponder)
+
+        # The time for the reply isn't known until the ponder search is hit,
+        # so it runs until finish_ponder_hit() stops it.
+        if ponder:
+            return "go ponder infinite\n"
+        return f"go movetime {self.move_time}\n"
+
+    def search_timeout(self) -> float:
+        """
+        :return: How long to wait for a search to finish, in seconds.
+        """
+        if self.clock is not None:
+            longest = max(self.clock.remaining(0), self.clock.remaining(1))
+        else:
+            longest = self.move_time
+        return longest / MS_PER_SECOND + SEARCH_TIMEOUT_MARGIN
+
+    def finish_ponder_hit(self) -> str:
+        """
+        Waits for the best move of a ponder search after `ponderhit`. The
+        search is stopped once the current move time, counted from when
+        pondering started, has run out, as a `go movetime` search would be.
+        :return: The bestmove message.
+        """
+        used = time.perf_counter() - self.ponder_start
+        try:
+            return self.wait_for(BESTMOVE,
+                                 self.move_time / MS_PER_SECOND - used)
+        except EngineTimeout:
+            self.write("stop\n")
+            return self.wait_for(BESTMOVE, self.search_timeout())
 
     def get_move(self) -> str:
         """
-        Calculates the best next move.
+        Calculates the best next move. If the engine hangs or crashes, it is
+        restarted and the search is run again.
         :return: Returns the best calculated move in LAN.
         """
-        self.write(f"go movetime {self.move_time}\n")
-        best_move = self.response("bestmove")
+        # Clock searches depend on the time left, so they aren't cached.
+        fen = self.fen if self.clock is None else None
+        if self.cache is not None and fen is not None:
+            cached = self.cache.get(fen, self.elo, self.move_time)
+            if cached is not None:
+                self.halt()
+                self.ponder_move = None
+                return cached
+
+        move = self.supervised(self.search)
+        if self.cache is not None and fen is not None:
+            self.cache.put(fen, self.elo, self.move_time, move)
+        return move
+
+    def search(self) -> str:
+        """
+        Runs one search and waits for the best move. On a ponder hit the
+        engine is told the expected move was played, so it can reply using
+        the search it has already done.
+        :return: Returns the best calculated move in LAN.
+        """
+        start = time.perf_counter()
+        self.clear(BESTMOVE)
+
+        hit = self.pondering and self.ponder_hit
+        if hit:
+            self.metrics.ponder_hit()
+            self.write("ponderhit\n")
+            self.ponder_hits += 1
+        else:
+            self.stop_ponder()
+            self.metrics.start_search()
+            self.write(self.go_command())
+        self.pondering = False
+        self.ponder_hit = False
+
+        if hit and self.clock is None:
+            best_move = self.finish_ponder_hit()
+        else:
+            best_move = self.wait_for(BESTMOVE, self.search_timeout())
+
+        if hit:
+            self.hit_reply_times.append(time.perf_counter() - start)
+        else:
+            self.search_reply_times.append(time.perf_counter() - start)
+
         # best_move is in the format 'bestmove a1a2 ponder b1b2'.
-        return best_move.split()[BEST_MOVE_POS]
+        words = best_move.split()
+        if len(words) > PONDER_MOVE_POS:
+            self.ponder_move = words[PONDER_MOVE_POS]
+        else:
+            self.ponder_move = None
+
+        move = words[BEST_MOVE_POS]
+        self.metrics.finish_search(move)
+        return move
+
+    def analyse(self, fen: str, lines: int = DEFAULT_ANALYSIS_LINES,
+                move_time: int | None = None) -> list[dict]:
+        """
+        Finds the best few moves in a position with their scores, using one
+        MultiPV search at full strength.
+        :param fen: The FEN string of the position to analyse.
+        :param lines: The number of moves to return. At most
+         MAX_ANALYSIS_LINES.
+        :param move_time: How long to search, in milliseconds. Defaults to the
+         engines move time. At most MAX_ANALYSIS_TIME.
+        :return: A list of dicts, best move first, with keys `move`, `pv`
+         (list of moves in LAN), `score_type` ('cp' or 'mate'), `score` (from
+         the side to moves point of view) and `depth`. There may be fewer
+         lines than asked for if there are fewer legal moves.
+        """
+        # Analysis runs on the worker thread like searches, so it waits for
+        # a game search to finish instead of overlapping it.
+        if threading.current_thread() is self.worker:
+            return self.run_analysis(fen, lines, move_time)
+        return self.analyse_async(fen, lines, move_time).result()
+
+    def analyse_async(self, fen: str, lines: int = DEFAULT_ANALYSIS_LINES,
+                      move_time: int | None = None) -> Future:
+        """
+        Starts analysing a position without blocking the caller. The
+        analysis runs after any search already started.
+        :param fen: The FEN string of the position to analyse.
+        :param lines: The number of moves to return.
+        :param move_time: How long to search, in milliseconds.
+        :return: A Future that resolves to the result of analyse().
+        """
+        return self.executor.submit(self.run_analysis, fen, lines, move_time)
+
+    def run_analysis(self, fen: str, lines: int, move_time: int | None) \
+            -> list[dict]:
+        """
+        Runs the search for analyse(). Runs on the worker thread.
+        :param fen: The FEN string of the position to analyse.
+        :param lines: The number of moves to return.
+        :param move_time: How long to search, in milliseconds.
+        :return: The result of analyse().
+        """
+        lines = max(1, min(lines, MAX_ANALYSIS_LINES))
+        if move_time is None:
+            move_time = self.move_time
+        move_time = min(move_time, MAX_ANALYSIS_TIME)
+
+        def request() -> list[dict]:
+            self.halt()
+            self.clear(INFO)
+            self.clear(BESTMOVE)
+            self.write(f"position fen {fen}\n")
+            self.write(f"go movetime {move_time}\n")
+            self.wait_for(BESTMOVE, move_time / MS_PER_SECOND
+                          + SEARCH_TIMEOUT_MARGIN)
+
+            # Every info line of the search is queued before the bestmove, so
+            # the last complete line for each multipv number is the deepest.
+            best_lines: dict[int, dict] = {}
+            while True:
+                try:
+                    info = parse_info(self.queues[INFO].get_nowait())
+                except queue.Empty:
+                    break
+                if "pv" not in info or "score" not in info \
+                        or "bound" in info:
+                    continue
+                best_lines[info.get("multipv", 1)] = info
+            return [{'move': info['pv'][0], 'pv': info['pv'],
+                     'score_type': info['score_type'],
+                     'score': info['score'], 'depth': info.get('depth')}
+                    for _, info in sorted(best_lines.items())]
+
+        # Stop pondering before changing options, so they don't reach the
+        # engine during the ponder search. The analysed position isn't the
+        # one pondered on, so the ponder counts as a miss.
+        self.stop_ponder()
+        self.ponder_move = None
+        limit_strength = self.options.get("UCI_LimitStrength", "true")
+        multipv = self.options.get("MultiPV", "1")
+        self.set_option("UCI_LimitStrength", "false")
+        self.set_option("MultiPV", lines)
+        try:
+            return self.supervised(request)
+        finally:
+            self.set_option("MultiPV", multipv)
+            self.set_option("UCI_LimitStrength", limit_strength)
+            # Put the engine back at the game position.
+            if self.fen is not None:
+                self.send(f"position fen {self.fen}\n")
+
+    def halt_async(self) -> Future:
+        """
+        Like halt(), but on the worker thread, so the caller doesn't wait
+        for the engine to stop.
+        :return: A Future that resolves once the search has stopped.
+        """
+        return self.executor.submit(self.halt)
+
+    def get_move_async(self, callback: Callable[[str], None] | None = None) \
+            -> Future:
+        """
+        Starts calculating the best next move without blocking the caller.
+        :param callback: Optional function called with the best move (in LAN)
+         once the search finishes. Called from the engine worker thread.
+        :return: A Future that resolves to the best move in LAN.
+        """
+        future = self.executor.submit(self.get_move)
+        if callback is not None:
+            future.add_done_callback(lambda done: callback(done.result()))
+        return future
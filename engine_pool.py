@@ -0,0 +1,174 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator
+
+import calibrate
+import engine
+from engine import Engine, EngineError
+from move_cache import MoveCache
+
+
+class EnginePool:
+    def __init__(self, size: int, path: list | None = None,
+                 cache: MoveCache | None = None,
+                 max_analysis: int | None = None) -> None:
+        """
+        Starts a fixed number of engine processes that games and analysis
+        jobs can check out, so several can run at once on a multi-core
+        machine.
+        :param size: The number of engine processes to start.
+        :param path: The command used to start each engine. Defaults to
+         engine.DEFAULT_PATH.
+        :param cache: An optional best move cache shared by every engine.
+        :param max_analysis: The most engines analysis jobs may hold at once,
+         so games can always get one. Defaults to all but one engine (or the
+         one engine, if the pool only has one).
+        """
+        if size < 1:
+            raise ValueError("Parameter `size` must be at least 1.")
+
+        self.size = size
+        self.path = engine.DEFAULT_PATH if path is None else path
+
+        # Engines wait for their UCI handshake when created, so start them
+        # all at once.
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            self.engines: list[Engine] = list(executor.map(
+                lambda _: Engine(self.path, cache), range(size)))
+
+        # Use the Threads/Hash calibrated for this many engines, if saved.
+        profile = calibrate.load_profile(size)
+        for pool_engine in self.engines:
+            calibrate.apply_profile(pool_engine, profile)
+        if max_analysis is None:
+            max_analysis = max(size - 1, 1)
+        self.analysis_slots = threading.BoundedSemaphore(max_analysis)
+        # The engines currently checked out for analysis.
+        self.analysing: set[int] = set()
+
+        self.idle: queue.Queue[Engine] = queue.Queue()
+        for pool_engine in self.engines:
+            self.idle.put(pool_engine)
+
+        # Counters for stats(). Guarded by self.lock.
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.total_wait = 0.0
+
+    def checkout(self, elo: int | None = None,
+                 timeout: float | None = None,
+                 analysis: bool = False) -> Engine:
+        """
+        Takes an engine out of the pool, waiting for one to be returned if
+        they are all busy. The engine is reset with ucinewgame, the variant
+        and the elo before it is handed out.
+        :param elo: The elo the engine should play at. Uses the engines
+         default elo if None.
+        :param timeout: The maximum time to wait for a free engine, in
+         seconds. Waits forever if None.
+        :param analysis: Whether the engine is for an analysis job. Analysis
+         jobs also wait for one of the max_analysis slots.
+        :return: The engine. Must be given back with checkin().
+        :raises EngineError: If the engine couldn't be reset. It is given
+         back to the pool, to be restarted by its next request.
+        """
+        with self.lock:
+            self.waiting += 1
+
+        start = time.perf_counter()
+        try:
+            # A timeout of None blocks until a slot is free.
+            if analysis and not self.analysis_slots.acquire(timeout=timeout):
+                raise TimeoutError("No analysis slot became free before the "
+                                   "timeout.")
+            try:
+                remaining = None if timeout is None else \
+                    max(timeout - (time.perf_counter() - start), 0)
+                pool_engine = self.idle.get(timeout=remaining)
+            except queue.Empty:
+                if analysis:
+                    self.analysis_slots.release()
+                raise TimeoutError("No engine became free before the "
+                                   "timeout.")
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+        with self.lock:
+            if analysis:
+                self.analysing.add(id(pool_engine))
+            self.in_use += 1
+            self.checkouts += 1
+            self.total_wait += time.perf_counter() - start
+
+        try:
+            ready = pool_engine.reset(elo)
+        except BaseException:
+            self.checkin(pool_engine)
+            raise
+        if not ready:
+            self.checkin(pool_engine)
+            raise EngineError("The engine wasn't ready after being reset.")
+        return pool_engine
+
+    def checkin(self, pool_engine: Engine) -> None:
+        """
+        Gives an engine back to the pool.
+        :param pool_engine: An engine from checkout().
+        """
+        with self.lock:
+            self.in_use -= 1
+            analysis = id(pool_engine) in self.analysing
+            self.analysing.discard(id(pool_engine))
+        if analysis:
+            self.analysis_slots.release()
+        self.idle.put(pool_engine)
+
+    @contextmanager
+    def engine(self, elo: int | None = None, timeout: float | None = None,
+               analysis: bool = False) -> Iterator[Engine]:
+        """
+        Checks out an engine for the duration of a with block.
+        :param elo: The elo the engine should play at.
+        :param timeout: The maximum time to wait for a free engine.
+        :param analysis: Whether the engine is for an analysis job.
+        """
+        pool_engine = self.checkout(elo, timeout, analysis)
+        try:
+            yield pool_engine
+        finally:
+            self.checkin(pool_engine)
+
+    def stats(self) -> dict:
+        """
+        Reports how busy the pool is.
+        :return: Returns a dict with keys `size`, `in_use`, `analysing`,
+         `utilisation` (the fraction of engines checked out), `queue_depth`
+         (the number of callers waiting for an engine), `checkouts` and
+         `average_wait` (in seconds).
+        """
+        with self.lock:
+            if self.checkouts:
+                average_wait = self.total_wait / self.checkouts
+            else:
+                average_wait = 0.0
+
+            return {'size': self.size,
+                    'in_use': self.in_use,
+                    'analysing': len(self.analysing),
+                    'utilisation': self.in_use / self.size,
+                    'queue_depth': self.waiting,
+                    'checkouts': self.checkouts,
+                    'average_wait': average_wait}
+
+    def close(self) -> None:
+        """
+        Stops every engine process in the pool.
+        """
+        for pool_engine in self.engines:
+            pool_engine.quit()
@@ -2,10 +2,12 @@ import datetime
 import os
 import pygame
 import sys
+import time
 import ctypes
 from button import Button, ImageButton
 from typing import Literal
 import board
+import sprites
 import pygame_widgets
 from pygame_widgets.slider import Slider
 from pygame_widgets.toggle import Toggle
@@ -49,6 +51,10 @@ NUM_RANKS = 6
 NUM_SQUARES = 36
 MOVE_LEN = 2
 
+# Used for the startup timing report.
+STARTUP_START = time.perf_counter()
+
+# The engine isn't started here. main_menu() starts it in the background.
 board = board.Board()
 
 pygame.init()
@@ -168,6 +174,9 @@ def main_menu() -> None:
     """
     Displays the main menu. Has the play, settings and tutorial button.
     """
+    # Start the engine while the user is in the menus.
+    board.start_engine()
+
     screen.fill(BLACK)
 
     # Set scaled background image.
@@ -210,6 +219,8 @@ def main_menu() -> None:
                              height=MENU_BUTTON_HEIGHT,
                              transparent=True)
 
+    startup_reported = False
+
     # Game loop
     while True:
         pygame.display.set_caption("Mini Chess")
@@ -243,6 +254,15 @@ def main_menu() -> None:
 
         pygame.display.update()
 
+        if 'first_menu_frame' not in board.startup_times:
+            board.startup_times['first_menu_frame'] = \
+                time.perf_counter() - STARTUP_START
+
+        # Print how long startup took once the engine is ready.
+        if not startup_reported and board.engine_ready.is_set():
+            print(board.startup_report())
+            startup_reported = True
+
 
 def settings(from_play: bool) -> None:
     """
@@ -280,7 +300,7 @@ def settings(from_play: bool) -> None:
 
     # Side selection
     IMAGE_SIZE = 8
-    white_image = pygame.image.load("assets/pieces/white/K.svg")
+    white_image = sprites.piece_sprite("K")
     side_white_image, side_white_rect = scale_image(white_image, (
         white_image.get_height() // IMAGE_SIZE,
         white_image.get_width() // IMAGE_SIZE))
@@ -296,7 +316,7 @@ def settings(from_play: bool) -> None:
                              height=side_white_image.get_height(),
                              transparent=True, image=side_white_image)
 
-    black_image = pygame.image.load("assets/pieces/black/k.svg")
+    black_image = sprites.piece_sprite("k")
     side_black_image, side_black_rect = scale_image(black_image, (
         black_image.get_height() // IMAGE_SIZE,
         black_image.get_width() // IMAGE_SIZE))
@@ -327,7 +347,35 @@ def settings(from_play: bool) -> None:
     slider = Slider(screen, int(w * HALF - SLIDER_LENGTH * HALF),
                     int(h * HALF + BUTTON_GAP * SLIDER_POS), SLIDER_LENGTH,
                     SLIDER_WIDTH, min=SLIDER_MIN, max=SLIDER_MAX, step=STEP,
-                    initial=board.engine.elo, handleColour=DARK_GRAY)
+                    initial=board.elo, handleColour=DARK_GRAY)
+
+    # Engine resource settings, on the left of the screen.
+    RESOURCE_X = 0.2
+    MAX_THREADS = os.cpu_count() or 1
+    HASH_MIN, HASH_MAX, HASH_STEP = 16, 1024, 16
+
+    threads_slider = Slider(screen, int(w * RESOURCE_X - SLIDER_LENGTH * HALF),
+                            int(h * HALF), SLIDER_LENGTH, SLIDER_WIDTH, min=1,
+                            max=MAX_THREADS, step=1,
+                            initial=min(board.threads, MAX_THREADS),
+                            handleColour=DARK_GRAY)
+
+    hash_slider = Slider(screen, int(w * RESOURCE_X - SLIDER_LENGTH * HALF),
+                         int(h * HALF + BUTTON_GAP * SLIDER_POS * DOUBLE),
+                         SLIDER_LENGTH, SLIDER_WIDTH, min=HASH_MIN,
+                         max=HASH_MAX, step=HASH_STEP,
+                         initial=max(HASH_MIN, min(board.hash_size, HASH_MAX)),
+                         handleColour=DARK_GRAY)
+
+    def apply_resources() -> None:
+        """
+        Passes the Threads and Hash slider values to the engine, and hides
+        the sliders.
+        """
+        board.change_threads(threads_slider.getValue())
+        board.change_hash(hash_slider.getValue())
+        threads_slider.hide()
+        hash_slider.hide()
 
     # Toggle Settings
     TOGGLE_WIDTH = 60
@@ -390,6 +438,17 @@ def settings(from_play: bool) -> None:
         slider_text_rect = slider_value_text.get_rect(
             center=(w * HALF, slider.get('y') + BUTTON_GAP * DOUBLE))
 
+        # Engine Threads and Hash settings
+        threads_text = get_font(MENU_TEXT_SIZE).render(
+            f"Engine Threads: {threads_slider.getValue()}", True, WHITE)
+        threads_rect = threads_text.get_rect(
+            center=(w * RESOURCE_X, threads_slider.get('y') - BUTTON_GAP))
+
+        hash_text = get_font(MENU_TEXT_SIZE).render(
+            f"Engine Hash: {hash_slider.getValue()} MB", True, WHITE)
+        hash_rect = hash_text.get_rect(
+            center=(w * RESOURCE_X, hash_slider.get('y') - BUTTON_GAP))
+
         events = pygame.event.get()
         pygame_widgets.update(events)
         for event in events:
@@ -401,6 +460,8 @@ def settings(from_play: bool) -> None:
                 if back_button.check_position(mouse_pos) is True:
                     toggle.hide()
                     slider.hide()
+                    threads_slider.hide()
+                    hash_slider.hide()
                     return
 
                 # White side selected
@@ -418,7 +479,8 @@ def settings(from_play: bool) -> None:
                 # Play button pressed
                 elif from_play and play_button.check_position(mouse_pos) \
                         is True:
-                    board.engine.change_elo(slider.getValue())
+                    board.change_elo(slider.getValue())
+                    apply_resources()
                     slider.hide()
                     toggle.hide()
                     play(toggle.getValue())
@@ -427,7 +489,8 @@ def settings(from_play: bool) -> None:
                 # Done button pressed
                 elif not from_play and done_button.check_position(mouse_pos) \
                         is True:
-                    board.engine.change_elo(slider.getValue())
+                    board.change_elo(slider.getValue())
+                    apply_resources()
                     slider.hide()
                     toggle.hide()
                     return
@@ -439,6 +502,9 @@ def settings(from_play: bool) -> None:
 
             screen.blit(colourblind_text, colourblind_rect)
 
+            screen.blit(threads_text, threads_rect)
+            screen.blit(hash_text, hash_rect)
+
             # Has to be indented so that the slider draws first
             # (otherwise causes flickering)
             pygame.display.update()
@@ -451,7 +517,6 @@ def tutorial():
     """
 
     pygame.display.set_caption("Tutorial")
-    path = "assets/pieces/white/"
     TUTO_TEXT_SIZE = 40
 
     while True:
@@ -488,9 +553,8 @@ def tutorial():
         screen.blit(goal, goal_rect)
 
         # Pawn movement
-        pawn_img = scale_image(pygame.image.load(f"{path}P.svg"),
-                               (img_size, img_size))
-        pawn_img_rect = pawn_img[1]
+        pawn_img = sprites.piece_sprite("P", img_size)
+        pawn_img_rect = pawn_img.get_rect()
         pawn = get_font(TUTO_TEXT_SIZE).render(
             "Pawns are the most basic piece.", True, WHITE)
         pawn_rect = pawn.get_rect(center=(w * HALF, goal_rect.bottom +
@@ -502,14 +566,13 @@ def tutorial():
                                             TXT_ADJUST))
         pawn_img_rect.center = (pawn_rect.left - img_size * HALF, pawn_rect.y
                                 + TXT_ADJUST)
-        screen.blit(pawn_img[0], pawn_img_rect)
+        screen.blit(pawn_img, pawn_img_rect)
         screen.blit(pawn, pawn_rect)
         screen.blit(pawn2, pawn2_rect)
 
         # Rook movement
-        rook_img = scale_image(pygame.image.load(f"{path}R.svg"),
-                               (img_size, img_size))
-        rook_img_rect = rook_img[1]
+        rook_img = sprites.piece_sprite("R", img_size)
+        rook_img_rect = rook_img.get_rect()
         rook = get_font(TUTO_TEXT_SIZE).render(
             "The rook can move vertically and horizontally for any number of "
             "squares.", True, WHITE)
@@ -518,7 +581,7 @@ def tutorial():
         rook_img_rect.center = (rook_rect.left - img_size * HALF,
                                 rook_rect.y + TXT_ADJUST)
         screen.blit(rook, rook_rect)
-        screen.blit(rook_img[0], rook_img_rect)
+        screen.blit(rook_img, rook_img_rect)
 
         # Knight movement
         knight = get_font(TUTO_TEXT_SIZE).render(
@@ -526,16 +589,15 @@ def tutorial():
             "another, like an 'L'.", True, WHITE)
         knight_rect = knight.get_rect(center=(w * HALF, rook_rect.bottom +
                                               TXT_ADJUST + LINE_BREAK))
-        knight_img = scale_image(pygame.image.load(f"{path}N.svg"),
-                                 (img_size, img_size))
-        knight_img_rect = knight_img[1]
+        knight_img = sprites.piece_sprite("N", img_size)
+        knight_img_rect = knight_img.get_rect()
         knight_img_rect.center = (knight_rect.left - img_size * HALF,
                                   knight_rect.y + TXT_ADJUST)
         knight2 = get_font(TUTO_TEXT_SIZE).render("They can jump over other "
                                                   "pieces.", True, WHITE)
         knight2_rect = knight2.get_rect(center=(w * HALF, knight_rect.bottom +
                                                 TXT_ADJUST))
-        screen.blit(knight_img[0], knight_img_rect)
+        screen.blit(knight_img, knight_img_rect)
         screen.blit(knight, knight_rect)
         screen.blit(knight2, knight2_rect)
 
@@ -543,14 +605,13 @@ def tutorial():
         queen = get_font(TUTO_TEXT_SIZE).render(
             "The queen can move horizontally, vertically, and diagonally.",
             True, WHITE)
-        queen_img = scale_image(pygame.image.load(f"{path}Q.svg"),
-                                (img_size, img_size))
-        queen_img_rect = queen_img[1]
+        queen_img = sprites.piece_sprite("Q", img_size)
+        queen_img_rect = queen_img.get_rect()
         queen_rect = queen.get_rect(center=(w * HALF, knight2_rect.bottom +
                                             TXT_ADJUST + LINE_BREAK))
         queen_img_rect.center = (queen_rect.left - img_size * HALF,
                                  queen_rect.y + TXT_ADJUST)
-        screen.blit(queen_img[0], queen_img_rect)
+        screen.blit(queen_img, queen_img_rect)
         screen.blit(queen, queen_rect)
 
         # King movement
@@ -559,13 +620,12 @@ def tutorial():
             " direction. ", True, WHITE)
         king_rect = king.get_rect(center=(w * HALF, queen_rect.bottom
                                           + TXT_ADJUST + LINE_BREAK))
-        king_img = scale_image(pygame.image.load(f"{path}K.svg"),
-                               (img_size, img_size))
-        king_img_rect = king_img[1]
+        king_img = sprites.piece_sprite("K", img_size)
+        king_img_rect = king_img.get_rect()
         king_img_rect.center = (king_rect.left - img_size * HALF,
                                 king_rect.y + TXT_ADJUST)
 
-        screen.blit(king_img[0], king_img_rect)
+        screen.blit(king_img, king_img_rect)
         screen.blit(king, king_rect)
 
         # Promotion information
@@ -642,7 +702,7 @@ def play(cb_mode: bool) -> None:
             file.write(f"User: {name}\n\n")
             file.write(f"Date: {formatted_date}\n")
             file.write(f"Time: {formatted_time}\n\n")
-            file.write(f"Engine ELO: {board.engine.elo}\n\n")
+            file.write(f"Engine ELO: {board.elo}\n\n")
             file.write(f"White: {white}\n")
             file.write(f"Black: {black}\n")
             file.write(f"Result: {winner}{end_reason}\n\n")
@@ -656,11 +716,31 @@ def play(cb_mode: bool) -> None:
 
     pygame.display.set_caption("Play")
 
+    # The engine starts in the background from the main menu. If the user
+    # got here first, keep the window responsive until it is ready.
+    starting_text = get_font(MENU_TEXT_SIZE).render("Starting engine...",
+                                                    True, WHITE)
+    starting_rect = starting_text.get_rect(center=(w * HALF, h * HALF))
+    ENGINE_WAIT = 0.05
+    while not board.wait_engine(timeout=ENGINE_WAIT):
+        if board.engine_error is not None:
+            print("Engine failed to start or is not ready")
+            return
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+
+        screen.fill(BLACK)
+        screen.blit(starting_text, starting_rect)
+        pygame.display.update()
+
     # The rect containing the full board. Resizes to fit window.
     TOPLEFT = (0, 0)
     board_rect = pygame.Rect(TOPLEFT, (h, h))
     square_width: int = board_rect.width // NUM_FILES
-    board.new_game(square_width)
+    board.new_game()
 
     # Check if the engine is ready to receive commands.
     if board.engine.is_ready() is False:
@@ -685,7 +765,6 @@ def play(cb_mode: bool) -> None:
             sq.draw(screen)
             squares.append(sq)
 
-    selected_piece = None
     selected_square = None
 
     # Not currently being used. Can be used for showing moves to user during
@@ -703,10 +782,11 @@ def play(cb_mode: bool) -> None:
 
         # Place images pieces onto board
         for square in squares:
-            piece = board.board[square.rank][square.file]
+            piece = board.on_square(square.file, square.rank)
             if piece is not None:
                 square.has_piece = True
-                square.draw(screen, piece.image)
+                square.draw(screen, sprites.piece_sprite(piece.letter,
+                                                         square_width))
             else:
                 square.has_piece = False
                 square.draw(screen)
@@ -813,7 +893,7 @@ def play(cb_mode: bool) -> None:
         info_rect = info_text.get_rect(left=LEFT, top=BUTTON_GAP * DOUBLE)
         screen.blit(info_text, info_rect)
 
-        elo_text = get_font(MENU_TEXT_SIZE).render(f"ELO: {board.engine.elo}",
+        elo_text = get_font(MENU_TEXT_SIZE).render(f"ELO: {board.elo}",
                                                    True, WHITE)
         elo_rect = elo_text.get_rect(left=LEFT, top=info_rect.bottom)
         screen.blit(elo_text, elo_rect)
@@ -838,13 +918,17 @@ def play(cb_mode: bool) -> None:
 
         pygame.display.update()
 
-        # Not the users turn
+        # Not the users turn. The engine searches in the background, so the
+        # loop keeps drawing and handling events until its reply arrives.
         if board.turn is False:
-            start, end = board.engine_move()
-            reset_shade()
-            squares[coords_to_index(start)].shade = True
-            squares[coords_to_index(end)].shade = True
-            continue
+            board.start_engine_move()
+            engine_reply = board.poll_engine_move()
+            if engine_reply is not None:
+                start, end = engine_reply
+                reset_shade()
+                squares[coords_to_index(start)].shade = True
+                squares[coords_to_index(end)].shade = True
+                continue
 
         # # Show square coords for testing.
         # for sq in squares:
@@ -857,21 +941,30 @@ def play(cb_mode: bool) -> None:
                 pygame.quit()
                 sys.exit()
 
-            if event.type == pygame.MOUSEBUTTONUP:
+            # Backspace takes back the users last move.
+            if event.type == pygame.KEYDOWN and \
+                    event.key == pygame.K_BACKSPACE and board.turn:
+                if board.takeback():
+                    reset_squares()
+                    reset_shade()
+
+            # Clicks are ignored while the engine is thinking.
+            if event.type == pygame.MOUSEBUTTONUP and board.turn:
                 mouse_pos = pygame.mouse.get_pos()
 
                 for square in squares:
                     clicked = square.check_position(mouse_pos)
                     if clicked:
                         if square.has_piece:
-                            piece = board.board[square.rank][square.file]
+                            piece = board.on_square(square.file,
+                                                    square.rank)
                             # if the piece is not the users colour
                             if piece.letter.isupper() is not bool(
                                     board.user_side):
                                 reset_squares()
-                                selected_piece = piece
                                 selected_square = square
-                                valid_moves = piece.valid_moves(board)
+                                valid_moves = board.legal_moves_from(
+                                    (square.file, square.rank))
                                 # Put dots on the valid locations
                                 for location in valid_moves:
                                     squares[coords_to_index(location
@@ -880,8 +973,8 @@ def play(cb_mode: bool) -> None:
 
                         if square.dot:
                             # move selected piece to dot.
-                            captured = board.move((selected_piece.file,
-                                                   selected_piece.rank),
+                            captured = board.move((selected_square.file,
+                                                   selected_square.rank),
                                                   (square.file, square.rank))
                             reset_shade()
                             square.shade = True
@@ -896,13 +989,7 @@ def play(cb_mode: bool) -> None:
                                     engine_captured.append(captured)
 
                             square.has_piece = True
-                            squares[coords_to_index((selected_piece.file,
-                                                     selected_piece.rank))]. \
-                                has_piece = False
-
-                            selected_piece.file = square.file
-                            selected_piece.rank = square.rank
-                            selected_piece.update()
+                            selected_square.has_piece = False
 
                             reset_squares()
 
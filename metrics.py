@@ -0,0 +1,196 @@
+import csv
+import json
+import threading
+import time
+from collections import deque
+
+MS_PER_SECOND = 1000
+DEFAULT_HISTORY = 1000
+
+# `info` fields followed by a single integer.
+INT_FIELDS = ("depth", "seldepth", "multipv", "nodes", "nps", "hashfull",
+              "tbhits", "time", "currmovenumber")
+
+# The columns written by EngineMetrics.to_csv(), in order.
+RECORD_FIELDS = ("start", "ponder_hit", "best_move", "time_to_bestmove",
+                 "engine_time", "overhead", "depth", "seldepth", "nodes",
+                 "nps", "hashfull", "score_type", "score", "pv")
+
+
+def parse_info(line: str) -> dict:
+    """
+    Parses a UCI `info` line into a dict.
+    E.g. 'info depth 5 score cp 20 nodes 800 pv a2a3 a5a4' ->
+    {'depth': 5, 'score_type': 'cp', 'score': 20, 'nodes': 800,
+    'pv': ['a2a3', 'a5a4']}.
+    :param line: The line of engine output, starting with `info`.
+    :return: The fields found on the line. `score_type` is 'cp' or 'mate',
+     and `bound` is 'lowerbound' or 'upperbound' if the score is a bound.
+     `info string` lines are returned as {'string': text}.
+    """
+    words = line.split()
+    parsed = {}
+    i = 1
+    while i < len(words):
+        word = words[i]
+        if word == "string":
+            parsed["string"] = " ".join(words[i + 1:])
+            break
+        elif word == "pv":
+            parsed["pv"] = words[i + 1:]
+            break
+        elif word == "score" and i + 2 < len(words):
+            parsed["score_type"] = words[i + 1]
+            parsed["score"] = int(words[i + 2])
+            i += 3
+            if i < len(words) and words[i] in ("lowerbound", "upperbound"):
+                parsed["bound"] = words[i]
+                i += 1
+        elif word in INT_FIELDS and i + 1 < len(words):
+            try:
+                parsed[word] = int(words[i + 1])
+            except ValueError:
+                pass
+            i += 2
+        elif word == "currmove" and i + 1 < len(words):
+            parsed["currmove"] = words[i + 1]
+            i += 2
+        else:
+            i += 1
+    return parsed
+
+
+class EngineMetrics:
+    def __init__(self, history: int = DEFAULT_HISTORY) -> None:
+        """
+        Collects a record for every engine search from its `info` lines and
+        the time until `bestmove`. Comparing the time until bestmove with the
+        time the engine reports shows how much of a slow reply was spent in
+        the engine, and how much in our own IPC and GUI code.
+        :param history: The number of search records to keep.
+        """
+        self.records: deque[dict] = deque(maxlen=history)
+        # The search that is running, if any.
+        self.current: dict | None = None
+        # info lines arrive on the reader thread, searches start and finish
+        # on the worker thread.
+        self.lock = threading.Lock()
+
+    def start_search(self) -> None:
+        """
+        Starts a new search record. Any unfinished record is dropped.
+        """
+        with self.lock:
+            self.current = {"start": time.perf_counter(),
+                            "ponder_hit": False}
+
+    def ponder_hit(self) -> None:
+        """
+        Marks the current (ponder) search as a ponder hit. The time to best
+        move is counted from now, as that is when the user started waiting.
+        """
+        with self.lock:
+            if self.current is not None:
+                self.current["start"] = time.perf_counter()
+                self.current["ponder_hit"] = True
+
+    def abandon(self) -> None:
+        """
+        Drops the current record, e.g. for a ponder search that was stopped.
+        """
+        with self.lock:
+            self.current = None
+
+    def on_info(self, info: dict) -> None:
+        """
+        Adds the fields of a parsed `info` line to the current record. Only
+        the main line is used when the engine reports several (MultiPV).
+        :param info: The result of parse_info().
+        """
+        with self.lock:
+            if self.current is None or info.get("multipv", 1) != 1:
+                return
+
+            record = self.current
+            if "depth" in info:
+                record["depth"] = max(record.get("depth", 0), info["depth"])
+            for field in ("seldepth", "nodes", "nps", "hashfull", "score",
+                          "score_type", "pv"):
+                if field in info:
+                    record[field] = info[field]
+            if "time" in info:
+                record["engine_time"] = info["time"] / MS_PER_SECOND
+
+    def finish_search(self, best_move: str) -> dict | None:
+        """
+        Completes the current record when the engine replies.
+        :param best_move: The engines move in LAN.
+        :return: The finished record, or None if no search was started.
+        """
+        with self.lock:
+            record = self.current
+            if record is None:
+                return None
+            self.current = None
+
+            record["best_move"] = best_move
+            record["time_to_bestmove"] = time.perf_counter() - \
+                record["start"]
+            # A ponder hit's engine time includes the time spent pondering.
+            if "engine_time" in record and not record["ponder_hit"]:
+                record["overhead"] = record["time_to_bestmove"] - \
+                    record["engine_time"]
+            self.records.append(record)
+            return record
+
+    def summary(self) -> dict:
+        """
+        Rolling aggregates over the kept records.
+        :return: Returns a dict with `searches`, and the average and maximum
+         of `time_to_bestmove`, `engine_time` and `overhead` (in seconds),
+         `nodes`, `nps`, `depth` and `hashfull`. E.g. `average_nps`,
+         `max_depth`.
+         Averages are None if no record has the field.
+        """
+        with self.lock:
+            records = list(self.records)
+
+        summary = {"searches": len(records)}
+        for field in ("time_to_bestmove", "engine_time", "overhead", "nodes",
+                      "nps", "depth", "hashfull"):
+            values = [record[field] for record in records if field in record]
+            if values:
+                summary[f"average_{field}"] = sum(values) / len(values)
+                summary[f"max_{field}"] = max(values)
+            else:
+                summary[f"average_{field}"] = None
+                summary[f"max_{field}"] = None
+        return summary
+
+    def to_json(self, path: str) -> None:
+        """
+        Writes the summary and every kept record to a JSON file.
+        :param path: The file to write.
+        """
+        with self.lock:
+            records = list(self.records)
+        with open(path, "w") as file:
+            json.dump({"summary": self.summary(), "records": records}, file,
+                      indent=2)
+
+    def to_csv(self, path: str) -> None:
+        """
+        Writes every kept record to a CSV file, one row per search.
+        :param path: The file to write.
+        """
+        with self.lock:
+            records = list(self.records)
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=RECORD_FIELDS,
+                                    extrasaction="ignore")
+            writer.writeheader()
+            for record in records:
+                row = dict(record)
+                if "pv" in row:
+                    row["pv"] = " ".join(row["pv"])
+                writer.writerow(row)
@@ -0,0 +1,274 @@
+import argparse
+import random
+import sys
+import threading
+import time
+import zlib
+
+import pyffish
+
+VARIANT = 'losalamos'
+MS_PER_SECOND = 1000
+
+# The think time of searches without a movetime (clock or depth
+# searches), in milliseconds.
+DEFAULT_THINK_TIME = 100
+DEFAULT_INFO_LINES = 10
+# The nodes per second reported in info lines and by `bench`.
+MOCK_NPS = 500000
+# The shortest wait between info lines, in seconds, so a search with no think
+# time doesn't spin.
+MIN_INTERVAL = 0.001
+
+
+class MockEngine:
+    def __init__(self, delay: int | None = None,
+                 info_lines: int = DEFAULT_INFO_LINES, dump_lines: int = 0,
+                 fail: str | None = None, fail_after: int = 1,
+                 startup_delay: int = 0) -> None:
+        """
+        A stand-in for Fairy-Stockfish that speaks the part of UCI that
+        engine.Engine uses, so the engine code, Board and the GUI can be
+        benchmarked and stress-tested without a native engine binary. Moves
+        are legal and chosen deterministically from the position. Use it by
+        setting the engine command, e.g.
+        LOS_ALAMOS_ENGINE="python mock_engine.py --delay 50".
+        :param delay: The think time of every search, in milliseconds. If
+         None, searches use the movetime they are given.
+        :param info_lines: The number of info lines sent per search (for
+         each MultiPV line).
+        :param dump_lines: Extra lines padding out the `d` board dump.
+        :param fail: 'hang' to stop responding, or 'crash' to exit, on the
+         `fail_after`th search. None to never fail.
+        :param fail_after: Which search fails, counting from 1.
+        :param startup_delay: How long to wait before `uciok`, in
+         milliseconds.
+        """
+        self.delay = delay
+        self.info_lines = info_lines
+        self.dump_lines = dump_lines
+        self.fail = fail
+        self.fail_after = fail_after
+        self.startup_delay = startup_delay
+
+        self.fen = pyffish.start_fen(VARIANT)
+        self.moves: list[str] = []
+        self.multipv = 1
+        self.searches = 0
+
+        self.output_lock = threading.Lock()
+        self.search_thread: threading.Thread | None = None
+        self.stop_event = threading.Event()
+        self.ponderhit_event = threading.Event()
+
+    def send(self, line: str, file=sys.stdout) -> None:
+        """
+        Writes one line of output.
+        :param line: The line, without a newline.
+        :param file: The stream to write to.
+        """
+        with self.output_lock:
+            file.write(line + "\n")
+            file.flush()
+
+    def chosen_moves(self) -> list[str]:
+        """
+        :return: The legal moves in the current position, best first. The
+         order is shuffled by a seed taken from the position, so the same
+         position always gets the same moves.
+        """
+        legal = sorted(pyffish.legal_moves(VARIANT, self.fen, self.moves))
+        fen = pyffish.get_fen(VARIANT, self.fen, self.moves)
+        random.Random(zlib.crc32(fen.encode())).shuffle(legal)
+        return legal
+
+    def search(self, think_time: float, ponder: bool,
+               infinite: bool = False) -> None:
+        """
+        Sends info lines for `think_time` milliseconds, then the best move.
+        Runs on the search thread.
+        :param think_time: How long to think, in milliseconds.
+        :param ponder: Whether this is a ponder search, which only finishes
+         on `stop`, or after `ponderhit` and the think time.
+        :param infinite: Whether the search only finishes on `stop`, even
+         after `ponderhit`.
+        """
+        candidates = self.chosen_moves()
+        start = time.perf_counter()
+        end = start + think_time / MS_PER_SECOND
+        interval = max(think_time / MS_PER_SECOND / max(self.info_lines, 1),
+                       MIN_INTERVAL)
+
+        depth = 0
+        while not self.stop_event.is_set():
+            if ponder and self.ponderhit_event.is_set():
+                ponder = False
+                end = time.perf_counter() + think_time / MS_PER_SECOND
+            if not ponder and not infinite and time.perf_counter() >= end:
+                break
+
+            if depth < self.info_lines:
+                depth += 1
+                elapsed = int((time.perf_counter() - start) * MS_PER_SECOND)
+                nodes = elapsed * MOCK_NPS // MS_PER_SECOND
+                for line, move in enumerate(candidates[:self.multipv]):
+                    score = (depth - line) * 5
+                    self.send(f"info depth {depth} seldepth {depth + 2} "
+                              f"multipv {line + 1} score cp {score} "
+                              f"nodes {nodes} nps {MOCK_NPS} hashfull 0 "
+                              f"time {elapsed} pv {move}")
+            if ponder or infinite:
+                self.stop_event.wait(interval)
+            else:
+                self.stop_event.wait(min(interval,
+                                         max(end - time.perf_counter(), 0)))
+
+        if not candidates:
+            self.send("bestmove (none)")
+            return
+
+        best = candidates[0]
+        replies = pyffish.legal_moves(VARIANT, self.fen,
+                                      self.moves + [best])
+        if replies:
+            self.send(f"bestmove {best} ponder {min(replies)}")
+        else:
+            self.send(f"bestmove {best}")
+
+    def stop_search(self) -> None:
+        """
+        Stops the running search, which then sends its best move.
+        """
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+    def go(self, words: list[str]) -> None:
+        """
+        Starts a search.
+        :param words: The words of the `go` command.
+        """
+        self.stop_search()
+        self.searches += 1
+        if self.fail is not None and self.searches == self.fail_after:
+            if self.fail == "crash":
+                sys.exit(1)
+            # Hang: stop reading commands, as a stuck engine would.
+            threading.Event().wait()
+
+        if self.delay is not None:
+            think_time = self.delay
+        elif "movetime" in words:
+            think_time = int(words[words.index("movetime") + 1])
+        else:
+            think_time = DEFAULT_THINK_TIME
+
+        self.stop_event.clear()
+        self.ponderhit_event.clear()
+        self.search_thread = threading.Thread(
+            target=self.search,
+            args=(think_time, "ponder" in words, "infinite" in words),
+            daemon=True)
+        self.search_thread.start()
+
+    def position(self, words: list[str]) -> None:
+        """
+        Sets the position.
+        :param words: The words of the `position` command.
+        """
+        if "moves" in words:
+            split = words.index("moves")
+            moves = words[split + 1:]
+        else:
+            split = len(words)
+            moves = []
+
+        if words[1] == "startpos":
+            self.fen = pyffish.start_fen(VARIANT)
+        else:
+            self.fen = " ".join(words[2:split])
+        self.moves = moves
+
+    def board_dump(self) -> None:
+        """
+        Sends a board dump in the format of the `d` command.
+        """
+        fen = pyffish.get_fen(VARIANT, self.fen, self.moves)
+        self.send(" +---+---+---+---+---+---+")
+        for rank in fen.split(" ")[0].split("/"):
+            squares = ""
+            for letter in rank:
+                squares += " |  " * int(letter) if letter.isdigit() \
+                    else f" | {letter}"
+            self.send(squares + " |")
+            self.send(" +---+---+---+---+---+---+")
+        for i in range(self.dump_lines):
+            self.send(f"Padding: {i}")
+        self.send(f"Fen: {fen}")
+        self.send("Checkers: ")
+
+    def run(self) -> None:
+        """
+        Reads commands from stdin until `quit` or the end of input.
+        """
+        for line in sys.stdin:
+            words = line.split()
+            if not words:
+                continue
+            command = words[0]
+
+            if command == "uci":
+                time.sleep(self.startup_delay / MS_PER_SECOND)
+                self.send("id name Mock Engine")
+                self.send("uciok")
+            elif command == "isready":
+                self.send("readyok")
+            elif command == "setoption" and "value" in words:
+                name = " ".join(words[2:words.index("value")])
+                if name == "MultiPV":
+                    self.multipv = int(words[-1])
+            elif command == "ucinewgame":
+                self.stop_search()
+            elif command == "position":
+                self.position(words)
+            elif command == "go":
+                self.go(words)
+            elif command == "stop":
+                self.stop_search()
+            elif command == "ponderhit":
+                self.ponderhit_event.set()
+            elif command == "d":
+                self.board_dump()
+            elif command == "bench":
+                # Fairy-Stockfish writes the bench summary to stderr.
+                self.send(f"Nodes/second    : {MOCK_NPS}", sys.stderr)
+            elif command == "quit":
+                break
+        self.stop_search()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="A mock UCI engine for benchmarks and stress tests.")
+    parser.add_argument("--delay", type=int, default=None,
+                        help="think time of every search in ms (default: "
+                             "the movetime given)")
+    parser.add_argument("--info-lines", type=int, default=DEFAULT_INFO_LINES,
+                        help="info lines sent per search")
+    parser.add_argument("--dump-lines", type=int, default=0,
+                        help="extra lines padding out the `d` board dump")
+    parser.add_argument("--fail", choices=("hang", "crash"), default=None,
+                        help="hang or crash on a search")
+    parser.add_argument("--fail-after", type=int, default=1,
+                        help="which search fails, counting from 1")
+    parser.add_argument("--startup-delay", type=int, default=0,
+                        help="ms to wait before uciok")
+    args = parser.parse_args()
+
+    MockEngine(args.delay, args.info_lines, args.dump_lines, args.fail,
+               args.fail_after, args.startup_delay).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import bitboard
+
+# The default file for the on-disk tier.
+DEFAULT_PATH = "move_cache.sqlite3"
+DEFAULT_CAPACITY = 10000
+DEFAULT_MAX_SAMPLES = 4
+
+# SQLite integers are signed 64-bit, so keys with the top bit set are stored
+# as negative numbers.
+SIGN_BIT = 1 << (bitboard.ZOBRIST_BITS - 1)
+
+
+def position_key(fen: str) -> int:
+    """
+    Gets the Zobrist key of a position. The key leaves out the move clocks,
+    so the same position reached at a different move number uses the same
+    cache entry.
+    :param fen: The FEN string.
+    :return: The 64-bit Zobrist key.
+    """
+    return bitboard.Position(fen).key
+
+
+def stored_key(key: tuple) -> tuple:
+    """
+    :param key: A (position, elo, move time) key.
+    :return: The key as stored in SQLite, with the position key signed.
+    """
+    position, elo, move_time = key
+    if position >= SIGN_BIT:
+        position -= SIGN_BIT << 1
+    return position, elo, move_time
+
+
+class MoveCache:
+    def __init__(self, path: str | None = DEFAULT_PATH,
+                 capacity: int = DEFAULT_CAPACITY, sample_rate: float = 0.0,
+                 max_samples: int = DEFAULT_MAX_SAMPLES) -> None:
+        """
+        Caches the engines best moves, keyed by position (its Zobrist key),
+        elo and move time.
+        Recently used entries are kept in memory, and every entry is saved to
+        an SQLite file so it survives restarts.
+        :param path: The SQLite file for the on-disk tier. If None, only the
+         in-memory tier is used.
+        :param capacity: The maximum number of keys kept in memory. The least
+         recently used key is evicted when it is full.
+        :param sample_rate: The chance (0 to 1) that a lookup is treated as a
+         miss anyway, so the engine searches again. Each new reply is added to
+         the moves stored for that key, and hits pick one of them at random.
+         Gives some variety at limited strength, where the engine doesn't
+         always play the same move.
+        :param max_samples: The maximum number of different moves stored per
+         key.
+        """
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.max_samples = max_samples
+
+        self.memory: OrderedDict[tuple, list[str]] = OrderedDict()
+        # The cache is shared between engine worker threads.
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self.connection = None
+        if path is not None:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS position_moves ("
+                "position INTEGER, elo INTEGER, move_time INTEGER, "
+                "move TEXT, PRIMARY KEY (position, elo, move_time, move))")
+            self.connection.commit()
+
+    def get(self, fen: str, elo: int, move_time: int) -> str | None:
+        """
+        Looks up the best move for a position.
+        :param fen: The FEN string of the position.
+        :param elo: The elo the engine is playing at.
+        :param move_time: The engines move time, in milliseconds.
+        :return: A cached move in LAN, or None on a miss.
+        """
+        key = (position_key(fen), elo, move_time)
+        with self.lock:
+            moves = self.memory.get(key)
+            if moves is not None:
+                self.memory.move_to_end(key)
+            else:
+                moves = self.load(key)
+
+            # Keep searching until there are enough samples to choose from.
+            if not moves or (len(moves) < self.max_samples
+                             and random.random() < self.sample_rate):
+                self.misses += 1
+                return None
+
+            if key in self.memory:
+                self.memory_hits += 1
+            else:
+                self.disk_hits += 1
+                self.remember(key, moves)
+            self.hits += 1
+            return random.choice(moves)
+
+    def put(self, fen: str, elo: int, move_time: int, move: str) -> None:
+        """
+        Adds the engines reply for a position.
+        :param fen: The FEN string of the position.
+        :param elo: The elo the engine was playing at.
+        :param move_time: The engines move time, in milliseconds.
+        :param move: The engines move in LAN.
+        """
+        key = (position_key(fen), elo, move_time)
+        with self.lock:
+            moves = self.memory.get(key)
+            if moves is None:
+                moves = self.load(key)
+            if move in moves or len(moves) >= self.max_samples:
+                return
+
+            moves = moves + [move]
+            self.remember(key, moves)
+            if self.connection is not None:
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO position_moves VALUES "
+                    "(?, ?, ?, ?)", (*stored_key(key), move))
+                self.connection.commit()
+
+    def load(self, key: tuple) -> list[str]:
+        """
+        Reads the moves stored for a key from the on-disk tier. Must be
+        called with self.lock held.
+        :param key: The (position, elo, move time) key.
+        :return: The stored moves. Empty if there are none.
+        """
+        if self.connection is None:
+            return []
+        rows = self.connection.execute(
+            "SELECT move FROM position_moves WHERE position = ? AND elo = ? "
+            "AND move_time = ?", stored_key(key)).fetchall()
+        return [row[0] for row in rows]
+
+    def remember(self, key: tuple, moves: list[str]) -> None:
+        """
+        Stores moves in the in-memory tier, evicting the least recently used
+        key if it is full. Must be called with self.lock held.
+        :param key: The (position, elo, move time) key.
+        :param moves: The moves to store.
+        """
+        self.memory[key] = moves
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """
+        :return: Returns a dict with keys `hits`, `misses`, `hit_rate`,
+         `memory_hits`, `disk_hits`, `evictions` and `size` (the number of
+         keys held in memory).
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / total if total else 0.0,
+                    'memory_hits': self.memory_hits,
+                    'disk_hits': self.disk_hits,
+                    'evictions': self.evictions,
+                    'size': len(self.memory)}
+
+    def close(self) -> None:
+        """
+        Closes the on-disk tier.
+        """
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
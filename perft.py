@@ -0,0 +1,266 @@
+import argparse
+import time
+
+import pyffish
+
+import bitboard
+from board import Board, LEN_SQUARE, PIECE_LETTERS
+from piece import Piece
+
+VARIANT = 'losalamos'
+DEFAULT_DEPTH = 3
+# "board" finds moves from piece.py and Board's squares array alone, so it
+# is a check on the bitboard generator rather than a copy of it.
+BACKENDS = ("board", "bitboard", "pyffish")
+
+# Positions with their perft counts, from depth 1 upwards, as counted by
+# pyffish. Between them they have captures, checks, promotions and an
+# ending.
+REFERENCE_POSITIONS = (
+    ("start", "rnqknr/pppppp/6/6/PPPPPP/RNQKNR w - - 0 1",
+     (10, 100, 1212, 14332)),
+    ("middlegame", "rnqkr1/pp1ppp/4n1/P4P/2NPPR/R1QKN1 w - - 1 7",
+     (14, 234, 3483, 59372)),
+    ("check", "rn1kr1/p2pp1/Q2Pp1/1q2N1/4PR/R2KN1 w - - 1 15",
+     (5, 74, 1427, 19046)),
+    ("promotion", "4r1/3kn1/p1rPpR/4P1/Pp1P2/RK4 b - - 1 23",
+     (21, 180, 3663, 32572)),
+    ("ending", "2r3/n5/N3pk/6/4K1/6 w - - 0 44",
+     (9, 135, 1041, 15340)),
+)
+
+
+def bitboard_perft(position: bitboard.Position, depth: int) -> int:
+    """
+    Counts the leaf nodes of the move tree with the bitboard move
+    generator.
+    :param position: The position to count from. Left as it was found.
+    :param depth: The number of plies to search.
+    :return: The number of positions `depth` plies from `position`.
+    """
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        position.push(move)
+        nodes += bitboard_perft(position, depth - 1)
+        position.pop()
+    return nodes
+
+
+def pyffish_perft(fen: str, moves: list[str], depth: int) -> int:
+    """
+    Counts the leaf nodes of the move tree with pyffish.
+    :param fen: The position the moves are played from.
+    :param moves: The moves played to reach the position to count from.
+    :param depth: The number of plies to search.
+    :return: The number of positions `depth` plies from the position.
+    """
+    legal = pyffish.legal_moves(VARIANT, fen, moves)
+    if depth == 1:
+        return len(legal)
+
+    nodes = 0
+    for move in legal:
+        nodes += pyffish_perft(fen, moves + [move], depth - 1)
+    return nodes
+
+
+def pseudo_moves(board: Board, white: bool) \
+        -> list[tuple[Piece, tuple[int, int], tuple[int, int]]]:
+    """
+    Finds every move of one side with the pieces' pseudo_moves(), without
+    checking whether they leave the king in check.
+    :param board: The board.
+    :param white: The side to find the moves of.
+    :return: The piece, start and end co-ordinates of each move, from the
+     users' perspective.
+    """
+    moves = []
+    for rank in range(board.MAX_RANK):
+        for file in range(board.MAX_FILE):
+            piece = board.on_square(file, rank)
+            if piece is not None and piece.letter.isupper() is white:
+                for end in piece.pseudo_moves(board, (file, rank)):
+                    moves.append((piece, (file, rank), end))
+    return moves
+
+
+def in_check(board: Board, white: bool) -> bool:
+    """
+    Checks whether a side's king is attacked, using the other sides
+    pseudo_moves() rather than the bitboard.
+    :param board: The board.
+    :param white: The side whose king to check.
+    :return: True if any piece of the other side can move onto the king.
+    """
+    king = board.board.index(PIECE_LETTERS.index('K' if white else 'k') + 1)
+    king_square = (king % board.MAX_FILE, king // board.MAX_FILE)
+    return any(end == king_square
+               for _, _, end in pseudo_moves(board, not white))
+
+
+def piece_moves(board: Board) -> list[str]:
+    """
+    Finds the legal moves of the side to move from piece.py alone: the
+    pieces' pseudo_moves(), less the moves that leave the king attacked.
+    This doesn't filter through Board.legal_moves_from(), which comes from
+    the bitboard, so a bug in either move generator shows up as a different
+    count.
+    :param board: The board.
+    :return: The moves in LAN. Promotions are listed once per piece they can
+     promote to.
+    """
+    white = board.position.turn == bitboard.WHITE
+    last_rank = '6' if white else '1'
+    moves = []
+    for piece, start, end in pseudo_moves(board, white):
+        if board.user_side == 1:
+            start = board.switch_side(start)
+            end = board.switch_side(end)
+        move = board.coords_to_square(*start) + board.coords_to_square(*end)
+
+        if piece.letter.lower() == 'p' and move[LEN_SQUARE + 1] == last_rank:
+            candidates = [move + promotion
+                          for promotion in bitboard.PROMOTIONS]
+        else:
+            candidates = [move]
+
+        # The piece promoted to can't change whether the king is safe.
+        board.push_move(candidates[0])
+        safe = not in_check(board, white)
+        board.unmake_move()
+        if safe:
+            moves.extend(candidates)
+    return moves
+
+
+def board_perft(board: Board, depth: int) -> int:
+    """
+    Counts the leaf nodes of the move tree through the game's own rules
+    path: moves from piece.py (see piece_moves()), played and taken back
+    with Board.push_move() and Board.unmake_move(). The squares array is
+    what the moves are generated from, so this is independent of the
+    bitboard generator.
+    :param board: The board to count from. Left as it was found.
+    :param depth: The number of plies to search.
+    :return: The number of positions `depth` plies from the board.
+    """
+    moves = piece_moves(board)
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        board.push_move(move)
+        nodes += board_perft(board, depth - 1)
+        board.unmake_move()
+    return nodes
+
+
+def perft(backend: str, fen: str, depth: int) -> int:
+    """
+    :param backend: The move generator to count with, one of BACKENDS.
+    :param fen: The position to count from.
+    :param depth: The number of plies to search.
+    :return: The number of positions `depth` plies from `fen`.
+    """
+    if backend == "board":
+        board = Board()
+        board.set_position(fen)
+        return board_perft(board, depth)
+    if backend == "bitboard":
+        return bitboard_perft(bitboard.Position(fen), depth)
+    if backend == "pyffish":
+        return pyffish_perft(fen, [], depth)
+    raise ValueError(f"Unknown perft backend: {backend}")
+
+
+def timed_perft(backend: str, fen: str, depth: int) -> dict:
+    """
+    :param backend: The move generator to count with, one of BACKENDS.
+    :param fen: The position to count from.
+    :param depth: The number of plies to search.
+    :return: Returns a dict with keys `nodes`, `seconds` and
+     `nodes_per_second`.
+    """
+    start = time.perf_counter()
+    nodes = perft(backend, fen, depth)
+    seconds = time.perf_counter() - start
+    return {'nodes': nodes, 'seconds': seconds,
+            'nodes_per_second': nodes / seconds if seconds else 0.0}
+
+
+def run_suite(backends: tuple[str, ...], max_depth: int) -> list[str]:
+    """
+    Checks the backends against the reference positions, printing the
+    speed of each.
+    :param backends: The backends to check.
+    :param max_depth: The deepest depth to check. Positions without a count
+     that deep are checked as deep as they have counts.
+    :return: A description of every wrong count. Empty if all were right.
+    """
+    failures = []
+    for name, fen, counts in REFERENCE_POSITIONS:
+        depth = min(max_depth, len(counts))
+        expected = counts[depth - 1]
+        for backend in backends:
+            result = timed_perft(backend, fen, depth)
+            status = "ok" if result['nodes'] == expected else "WRONG"
+            print(f"{name:<12} {backend:<9} depth {depth}: "
+                  f"{result['nodes']:>8} nodes "
+                  f"{result['nodes_per_second']:>10.0f} nodes/sec  {status}")
+            if result['nodes'] != expected:
+                failures.append(f"{name} ({backend}, depth {depth}): "
+                                f"{result['nodes']}, expected {expected}")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Count and time the move trees of Los Alamos positions.")
+    parser.add_argument("--fen", default=None,
+                        help="the position to count from (default: the "
+                             "start position)")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH,
+                        help="the number of plies to search")
+    parser.add_argument("--backend", choices=BACKENDS, action="append",
+                        help="a move generator to count with, can be given "
+                             "more than once (default: all of them)")
+    parser.add_argument("--suite", action="store_true",
+                        help="check the reference positions instead")
+    args = parser.parse_args()
+    backends = tuple(args.backend) if args.backend else BACKENDS
+
+    if args.suite:
+        failures = run_suite(backends, args.depth)
+        for failure in failures:
+            print(f"Wrong count: {failure}")
+        if failures:
+            raise SystemExit(1)
+        return
+
+    fen = args.fen or pyffish.start_fen(VARIANT)
+    results = {}
+    for backend in backends:
+        results[backend] = timed_perft(backend, fen, args.depth)
+        print(f"{backend:<9} {results[backend]['nodes']:>10} nodes in "
+              f"{results[backend]['seconds']:.2f} s "
+              f"({results[backend]['nodes_per_second']:.0f} nodes/sec)")
+
+    # pyffish is the reference the other backends are checked against.
+    expected = results['pyffish']['nodes'] if 'pyffish' in results \
+        else pyffish_perft(fen, [], args.depth)
+    wrong = [backend for backend, result in results.items()
+             if result['nodes'] != expected]
+    for backend in wrong:
+        print(f"Wrong count: {backend} found {results[backend]['nodes']}, "
+              f"pyffish found {expected}")
+    if wrong:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,94 @@
-import pygame
-import pyffish
-
-END = 2
-FULL_MOVE_LEN = 4
-START = 0
+# The edges of the board.
+MIN_FILE = 0
+MIN_RANK = 0
+MAX_FILE = 5
+MAX_RANK = 5
+
+# The (file, rank) steps each piece can take. Rays are listed in the order
+# they are searched.
+KNIGHT_STEPS = ((1, 2), (1, -2), (-1, 2), (-1, -2),
+                (2, 1), (-2, 1), (2, -1), (-2, -1))
+KING_STEPS = ((0, -1), (-1, -1), (1, -1), (0, 1),
+              (-1, 1), (1, 1), (-1, 0), (1, 0))
+ROOK_DIRECTIONS = ((0, 1), (0, -1), (-1, 0), (1, 0))
+DIAGONAL_DIRECTIONS = ((-1, 1), (1, 1), (-1, -1), (1, -1))
+
+# The piece letters in piece code order. Squares of the board hold a piece
+# code, the index of the letter plus one, and 0 for an empty square.
+PIECE_LETTERS = "PNRQKpnrqk"
+
+
+def on_board(file: int, rank: int) -> bool:
+    """
+    :return: Returns True if the co-ordinates are on the board.
+    """
+    return MIN_FILE <= file <= MAX_FILE and MIN_RANK <= rank <= MAX_RANK
+
+
+def step_table(steps: tuple[tuple[int, int], ...]) \
+        -> dict[tuple[int, int], tuple[tuple[int, int], ...]]:
+    """
+    Works out where a leaping piece can go from every square.
+    :param steps: The (file, rank) steps the piece can take.
+    :return: The squares on the board one step away, keyed by square.
+    """
+    table = {}
+    for file in range(MIN_FILE, MAX_FILE + 1):
+        for rank in range(MIN_RANK, MAX_RANK + 1):
+            table[(file, rank)] = tuple(
+                (file + d_file, rank + d_rank) for d_file, d_rank in steps
+                if on_board(file + d_file, rank + d_rank))
+    return table
+
+
+def ray_table(directions: tuple[tuple[int, int], ...]) \
+        -> dict[tuple[int, int], tuple[tuple[tuple[int, int], ...], ...]]:
+    """
+    Works out the rays a sliding piece can move along from every square.
+    :param directions: The (file, rank) step of each ray.
+    :return: The rays, keyed by square. Each ray lists its squares from
+     nearest to furthest, and rays that leave the board straight away are
+     left out.
+    """
+    table = {}
+    for file in range(MIN_FILE, MAX_FILE + 1):
+        for rank in range(MIN_RANK, MAX_RANK + 1):
+            rays = []
+            for d_file, d_rank in directions:
+                ray = []
+                ray_file, ray_rank = file + d_file, rank + d_rank
+                while on_board(ray_file, ray_rank):
+                    ray.append((ray_file, ray_rank))
+                    ray_file += d_file
+                    ray_rank += d_rank
+                if ray:
+                    rays.append(tuple(ray))
+            table[(file, rank)] = tuple(rays)
+    return table
+
+
+# Worked out once, so pieces find their moves by looking them up.
+KNIGHT_TARGETS = step_table(KNIGHT_STEPS)
+KING_TARGETS = step_table(KING_STEPS)
+ROOK_RAYS = ray_table(ROOK_DIRECTIONS)
+QUEEN_RAYS = ray_table(ROOK_DIRECTIONS + DIAGONAL_DIRECTIONS)
 
 
 class Piece:
-    def __init__(self, letter: str, file: int, rank: int,
-                 image: pygame.Surface, w: float):
-        self.letter = letter
-        self.file = file  # 0-5
-        self.rank = rank  # 0-5
-
-        self.LEFT = False
-        self.RIGHT = False
-        self.TOP = False
-        self.BOTTOM = False
-
-        self.MAX_FILE = 5
-        self.MAX_RANK = 5
-        self.MIN_FILE = 0
-        self.MIN_RANK = 0
-
-        self.w = w
-        self.image = pygame.transform.smoothscale(image, (w, w))
+    # Pieces are flyweights: the board holds piece codes, and every square
+    # with the same piece shares one immutable instance, which knows what the
+    # piece is but not where it is. They have no images, so the rules run
+    # without pygame; the GUI draws them from the sprite cache.
+    __slots__ = ("letter",)
 
-        self.update()
-
-    def square(self) -> tuple[int, int]:
+    def __init__(self, letter: str):
         """
-        Returns the co-ordinates of the current square that the piece is on.
-        :return:
+        :param letter: The pieces letter, upper case for white.
         """
-        return self.file, self.rank
+        object.__setattr__(self, "letter", letter)
 
-    def update(self) -> None:
-        """
-        Updates the pieces internal variables, based on its current position.
-        :return:
-        """
-        self.LEFT = False
-        self.RIGHT = False
-        self.TOP = False
-        self.BOTTOM = False
-
-        if self.file == self.MIN_FILE:
-            self.LEFT = True
-        elif self.file == self.MAX_FILE:
-            self.RIGHT = True
-
-        if self.rank == self.MIN_RANK:
-            self.BOTTOM = True
-        elif self.rank == self.MAX_RANK:
-            self.TOP = True
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError("Pieces are shared, so can't be changed.")
 
     def can_move(self, square) -> bool:
         """
@@ -66,71 +101,64 @@ class Piece:
             return True
         return False
 
-    def check_valid_moves(self, moves: list[tuple[int, int]],
-                          board) -> list[tuple[int, int]]:
+    def step_moves(self, board, targets: tuple[tuple[int, int], ...]) \
+            -> list[tuple[int, int]]:
         """
-        Checks a given list of moves against fully valid moves.
-        :param moves: The moves to check
-        :param board: An instance of board, to get information from.
-        :return: Returns a list of fully valid moves (Moves in both the moves
-        list and the valid moves list).
+        Finds the moves of a leaping piece.
+        :param board: The current board instance.
+        :param targets: The squares the piece can reach, from step_table().
+        :return: The targets that are empty or have an enemy piece on them.
         """
+        return [target for target in targets
+                if self.can_move(board.on_square(*target))]
 
-        valid_moves = pyffish.legal_moves(board.VARIANT, board.START_FEN,
-                                          board.moves)
-
-        moves_square = []
-
-        # Converts all moves from co-ordinates to squares.
-        for i in range(len(moves)):
-            moves_square.append(board.coords_to_square(self.file, self.rank)
-                                + board.coords_to_square(*moves[i]))
-
-        moves_to_return = []
-
-        black = True if board.user_side == 1 else False
-        for i in range(len(moves_square)):
-            move = moves_square[i]
-
-            # For every move in moves_square, switch sides if user is playing
-            # black. Then check if it's in the valid_moves list. If so, add
-            # the co-ordinate version of the square into moves_to_return.
-
-            if black:
-                start_square = board.switch_side_square(move[:END])
-                end_square = board.switch_side_square(move[END:])
-                square = start_square + end_square
-            else:
-                square = move
-
-            for item in valid_moves:
-                if square == item[START:FULL_MOVE_LEN]:
-                    moves_to_return.append(moves[i])
-
-        # cast to a Set to remove duplicates from promotions.
-        return list(set(moves_to_return))
-
-    # def print_info(self):
-    #     print(self.file)
-    #     print(self.rank)
+    def ray_moves(self, board,
+                  rays: tuple[tuple[tuple[int, int], ...], ...]) \
+            -> list[tuple[int, int]]:
+        """
+        Finds the moves of a sliding piece. Each ray is followed until it
+        reaches a piece, which can be captured if it is an enemy piece.
+        :param board: The current board instance.
+        :param rays: The rays of the piece, from ray_table().
+        :return: The squares the piece can move to.
+        """
+        moves = []
+        for ray in rays:
+            for target in ray:
+                on_target = board.on_square(*target)
+                if on_target is None:
+                    moves.append(target)
+                    continue
+                # If there is an enemy piece on the square
+                if on_target.letter.isupper() is self.letter.islower():
+                    moves.append(target)
+                break
+        return moves
 
 
 class Pawn(Piece):
-    def __init__(self, letter: str, file: int, rank: int,
-                 image: pygame.Surface, w: int):
-        super().__init__(letter, file, rank, image, w)
+    __slots__ = ()
 
-    def valid_moves(self, board) -> list:
+    def pseudo_moves(self, board, square: tuple[int, int]) -> list:
         """
-        Calculates the valid moves for this Pawn.
+        Calculates the moves for this Pawn, without checking whether they
+        leave the king in check.
         :param board: The current board instance
+        :param square: The co-ordinates of the square the piece is on.
         :return:
         """
+        piece_file, piece_rank = square
         moves = []
 
-        next_square = (self.file, self.rank + 1)
-        left = (self.file - 1, self.rank + 1)
-        right = (self.file + 1, self.rank + 1)
+        # The users pawns move up the board, and the engines pawns move down.
+        if self.letter.isupper() is not bool(board.user_side):
+            next_rank = piece_rank + 1
+        else:
+            next_rank = piece_rank - 1
+
+        next_square = (piece_file, next_rank)
+        left = (piece_file - 1, next_rank)
+        right = (piece_file + 1, next_rank)
 
         on_next_square = board.on_square(*next_square)
 
@@ -139,343 +167,84 @@ class Pawn(Piece):
 
         # Skip checking for captures on left/right if the piece is on the
         # left/right most file.
-        if not self.LEFT:
+        if piece_file != MIN_FILE:
             on_left = board.on_square(*left)
             # If there is a piece and the piece is not the same colour.
             if (on_left and on_left.letter.isupper() is
                     not self.letter.isupper()):
                 moves.append(left)
 
-        if not self.RIGHT:
+        if piece_file != MAX_FILE:
             on_right = board.on_square(*right)
             if (on_right and on_right.letter.isupper() is not
                     self.letter.isupper()):
                 moves.append(right)
 
-        return self.check_valid_moves(moves, board)
+        return moves
 
 
 class Knight(Piece):
-    def __init__(self, letter: str, file: int, rank: int,
-                 image: pygame.Surface, w: int):
-        super().__init__(letter, file, rank, image, w)
+    __slots__ = ()
 
-    def valid_moves(self, board) -> list:
+    def pseudo_moves(self, board, square: tuple[int, int]) -> list:
         """
-        Calculates and returns the valid moves for this knight.
+        Calculates and returns the moves for this knight, without checking
+        whether they leave the king in check.
         :param board:
+        :param square: The co-ordinates of the square the piece is on.
         :return:
         """
-        moves = []
-
-        # Skip checking for moves on the right if the knight is on the right.
-        if not self.RIGHT:
-            right = self.file + 1
-
-            # 2 up, 1 right
-            if self.rank + 2 <= self.MAX_RANK:
-                move_right = (right, self.rank + 2)
-                on_up_right = board.on_square(*move_right)
-                if self.can_move(on_up_right):
-                    moves.append(move_right)
-
-            # 2 down, 1 right
-            if self.rank - 2 >= self.MIN_RANK:
-                move_right = (right, self.rank - 2)
-                on_down_right = board.on_square(*move_right)
-                if self.can_move(on_down_right):
-                    moves.append(move_right)
-
-        # Skip checking for moves on the left if the knight is on the left.
-        if not self.LEFT:
-            left = self.file - 1
-
-            # 2 up, 1 left
-            if self.rank + 2 <= self.MAX_RANK:
-                move_left = (left, self.rank + 2)
-                on_up_left = board.on_square(*move_left)
-                if self.can_move(on_up_left):
-                    moves.append(move_left)
-
-            # 2 down, 1 left
-            if self.rank - 2 >= self.MIN_RANK:
-                move_left = (left, self.rank - 2)
-                on_down_left = board.on_square(*move_left)
-                if self.can_move(on_down_left):
-                    moves.append(move_left)
-
-        # Skip checking for moves above if the knight is on the top rank.
-        if not self.TOP:
-            up = self.rank + 1
-
-            # 2 right, 1 up
-            if self.file + 2 <= self.MAX_FILE:
-                move_up = (self.file + 2, up)
-                on_right_up = board.on_square(*move_up)
-                if self.can_move(on_right_up):
-                    moves.append(move_up)
-
-            # 2 left, 1 up
-            if self.file - 2 >= self.MIN_FILE:
-                move_up = (self.file - 2, up)
-                on_left_up = board.on_square(*move_up)
-                if self.can_move(on_left_up):
-                    moves.append(move_up)
-
-        # Skip checking for moves below if the knight is on the bottom rank.
-        if not self.BOTTOM:
-            down = self.rank - 1
-
-            # 2 right, 1 down
-            if self.file + 2 <= self.MAX_FILE:
-                move_down = (self.file + 2, down)
-                on_right_down = board.on_square(*move_down)
-                if self.can_move(on_right_down):
-                    moves.append(move_down)
-
-            # 2 left, 1 down
-            if self.file - 2 >= self.MIN_FILE:
-                move_down = (self.file - 2, down)
-                on_left_down = board.on_square(*move_down)
-                if self.can_move(on_left_down):
-                    moves.append(move_down)
-
-        return self.check_valid_moves(moves, board)
+        moves = self.step_moves(board, KNIGHT_TARGETS[square])
+        return moves
 
 
 class Rook(Piece):
-    def __init__(self, letter: str, file: int, rank: int,
-                 image: pygame.Surface, w: int):
-        super().__init__(letter, file, rank, image, w)
+    __slots__ = ()
 
-    def valid_moves(self, board) -> list:
+    def pseudo_moves(self, board, square: tuple[int, int]) -> list:
         """
-        Calculates and returns the valid moves for this rook
+        Calculates and returns the moves for this rook, without checking
+        whether they leave the king in check.
         :param board: THe current board instance.
+        :param square: The co-ordinates of the square the piece is on.
         :return:
         """
-        moves = []
-
-        # Check upwards
-        rank = self.rank
-        while rank < self.MAX_RANK:
-            next_square = (self.file, rank + 1)
-            on_next_square = board.on_square(*next_square)
-
-            # If there is no piece on the next square.
-            if on_next_square is None:
-                moves.append(next_square)
-                rank += 1
-            # If there is an enemy piece on the next square
-            elif on_next_square.letter.isupper() is self.letter.islower():
-                moves.append(next_square)
-                break
-            else:
-                break
-
-        # Check downwards
-        rank = self.rank
-        while rank > self.MIN_RANK:
-            next_square = (self.file, rank - 1)
-            on_next_square = board.on_square(*next_square)
-
-            if on_next_square is None:
-                moves.append(next_square)
-                rank -= 1
-            elif on_next_square.letter.isupper() is self.letter.islower():
-                moves.append(next_square)
-                break
-            else:
-                break
-
-        # Check left
-        file = self.file
-        while file > self.MIN_FILE:
-            next_square = (file - 1, self.rank)
-            on_next_square = board.on_square(*next_square)
-
-            if on_next_square is None:
-                moves.append(next_square)
-                file -= 1
-            elif on_next_square.letter.isupper() is self.letter.islower():
-                moves.append(next_square)
-                break
-            else:
-                break
-
-        # Check right
-        file = self.file
-        while file < self.MAX_FILE:
-            next_square = (file + 1, self.rank)
-            on_next_square = board.on_square(*next_square)
-
-            if on_next_square is None:
-                moves.append(next_square)
-                file += 1
-            elif on_next_square.letter.isupper() is self.letter.islower():
-                moves.append(next_square)
-                break
-            else:
-                break
-
-        return self.check_valid_moves(moves, board)
+        moves = self.ray_moves(board, ROOK_RAYS[square])
+        return moves
 
 
 class Queen(Piece):
-    def __init__(self, letter: str, file: int, rank: int,
-                 image: pygame.Surface, w: int):
-        super().__init__(letter, file, rank, image, w)
+    __slots__ = ()
 
-    def valid_moves(self, board) -> list:
+    def pseudo_moves(self, board, square: tuple[int, int]) -> list:
         """
-        Calculates and returns the valid moves for this queen.
+        Calculates and returns the moves for this queen, without checking
+        whether they leave the king in check.
         :param board: The current board instance
+        :param square: The co-ordinates of the square the piece is on.
         :return:
         """
-        moves = []
-
-        # Steal rook movement code
-        temp_rook = Rook(self.letter, self.file, self.rank, self.image,
-                         int(self.w))
-        # Add rooks valid moves to queens moves.
-        moves.extend(temp_rook.valid_moves(board))
-        del temp_rook
-
-        # Diagonals
-        file = self.file
-        rank = self.rank
-
-        # Up and Left
-        if not self.TOP:
-            if not self.LEFT:
-                while rank < self.MAX_RANK and file > self.MIN_FILE:
-                    next_square = (file - 1, rank + 1)
-                    on_square = board.on_square(*next_square)
-
-                    if self.can_move(on_square):
-                        moves.append(next_square)
-                        file -= 1
-                        rank += 1
-
-                        if on_square is not None and on_square.letter.isupper() \
-                                is self.letter.islower():
-                            break
-                    else:
-                        break
-
-            # Up and Right
-            file = self.file
-            rank = self.rank
-            if not self.RIGHT:
-                while rank < self.MAX_RANK and file < self.MAX_FILE:
-                    next_square = (file + 1, rank + 1)
-                    on_square = board.on_square(*next_square)
-
-                    if self.can_move(on_square):
-                        moves.append(next_square)
-                        file += 1
-                        rank += 1
-                        if (on_square is not None and
-                                on_square.letter.isupper()
-                                is self.letter.islower()):
-                            break
-                    else:
-                        break
-
-        rank = self.rank
-        file = self.file
-
-        if not self.BOTTOM:
-            if not self.LEFT:
-                # Down and left
-                while rank > self.MIN_RANK and file > self.MIN_FILE:
-                    next_square = (file - 1, rank - 1)
-                    on_square = board.on_square(*next_square)
-
-                    if self.can_move(on_square):
-                        moves.append(next_square)
-                        file -= 1
-                        rank -= 1
-                        if on_square is not None and \
-                                on_square.letter.isupper() is \
-                                self.letter.islower():
-                            break
-                    else:
-                        break
-
-            # Down and Right
-            file = self.file
-            rank = self.rank
-
-            if not self.RIGHT:
-                while rank > self.MIN_RANK and file < self.MAX_FILE:
-                    next_square = (file + 1, rank - 1)
-                    on_square = board.on_square(*next_square)
-
-                    if self.can_move(on_square):
-                        moves.append(next_square)
-                        file += 1
-                        rank -= 1
-                        if (on_square is not None and
-                                on_square.letter.isupper()
-                                is self.letter.islower()):
-                            break
-                    else:
-                        break
-
-        return self.check_valid_moves(moves, board)
+        moves = self.ray_moves(board, QUEEN_RAYS[square])
+        return moves
 
 
 class King(Piece):
-    def __init__(self, letter: str, file: int, rank: int,
-                 image: pygame.Surface, w: int):
-        super().__init__(letter, file, rank, image, w)
+    __slots__ = ()
 
-    def valid_moves(self, board) -> list:
+    def pseudo_moves(self, board, square: tuple[int, int]) -> list:
         """
-        Calculates and return the valid moves for this king.
+        Calculates and return the moves for this king, without checking
+        whether they leave it in check.
         :param board: The current board instance.
+        :param square: The co-ordinates of the square the piece is on.
         :return:
         """
-        moves = []
+        moves = self.step_moves(board, KING_TARGETS[square])
+        return moves
 
-        # Skip checking for moves below if the king is on the bottom rank.
-        if not self.BOTTOM:
-            move_down = self.rank - 1
-            moves_down = [(self.file, move_down)]
-
-            if not self.LEFT:
-                moves_down.append((self.file - 1, move_down))
-            if not self.RIGHT:
-                moves_down.append((self.file + 1, move_down))
-
-            for move in moves_down:
-                if self.can_move(board.on_square(*move)):
-                    moves.append(move)
-
-        # Skip checking for moves above if the king is on the top rank.
-        if not self.TOP:
-            move_up = self.rank + 1
-            moves_up = [(self.file, move_up)]
-
-            if not self.LEFT:
-                moves_up.append((self.file - 1, move_up))
-            if not self.RIGHT:
-                moves_up.append((self.file + 1, move_up))
-
-            for move in moves_up:
-                if self.can_move(board.on_square(*move)):
-                    moves.append(move)
-
-        # Can just check for adjacent square, diagonals were checked above
-        if not self.LEFT:
-            left = (self.file - 1, self.rank)
-            if self.can_move(board.on_square(*left)):
-                moves.append(left)
-
-        if not self.RIGHT:
-            right = (self.file + 1, self.rank)
-            if self.can_move(board.on_square(*right)):
-                moves.append(right)
 
-        return self.check_valid_moves(moves, board)
+# The class of each piece, keyed by lower case letter.
+PIECE_TYPES = {'p': Pawn, 'n': Knight, 'r': Rook, 'q': Queen, 'k': King}
+# One shared Piece for every piece code. Index 0, an empty square, is None.
+PIECES: tuple[Piece | None, ...] = (None,) + tuple(
+    PIECE_TYPES[letter.lower()](letter) for letter in PIECE_LETTERS)
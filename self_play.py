@@ -0,0 +1,300 @@
+import argparse
+import datetime
+import itertools
+import os
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import engine
+from board import Board
+from engine_pool import EnginePool
+from time_manager import Clock, MS_PER_SECOND
+
+DRAW = -1
+WHITE_WIN = 0
+BLACK_WIN = 1
+
+GAMES_DIR = "games/self_play/"
+DEFAULT_GAMES = 2
+DEFAULT_MOVE_TIME = 500
+# Games still going after this many plies are drawn.
+MAX_PLIES = 200
+# Games are drawn after this many plies without a capture or pawn move.
+FIFTY_MOVE_PLIES = 100
+SECONDS_PER_HOUR = 3600
+
+
+def parse_player(text: str) -> tuple[int, int]:
+    """
+    :param text: A player given as 'elo:move_time', e.g. '800:500'. The move
+     time is in milliseconds and can be left out.
+    :return: The elo and move time.
+    """
+    elo, _, move_time = text.partition(":")
+    return int(elo), int(move_time) if move_time else DEFAULT_MOVE_TIME
+
+
+def parse_time_control(text: str) -> tuple[int, int]:
+    """
+    :param text: A time control given as 'seconds+increment', e.g. '60+1'.
+     The increment can be left out.
+    :return: The starting time and increment, in milliseconds.
+    """
+    base, _, increment = text.partition("+")
+    return (int(float(base) * MS_PER_SECOND),
+            int(float(increment or 0) * MS_PER_SECOND))
+
+
+def player_name(player: tuple[int, int]) -> str:
+    """
+    :param player: The elo and move time of a player.
+    :return: The name the player is saved and reported under.
+    """
+    elo, move_time = player
+    return f"Fairy-Stockfish {elo} ({move_time} ms)"
+
+
+def play_game(pool: EnginePool, white: tuple[int, int],
+              black: tuple[int, int], max_plies: int = MAX_PLIES,
+              time_control: tuple[int, int] | None = None) -> dict:
+    """
+    Plays one engine-vs-engine game. The rules are checked by a Board with
+    no display.
+    :param pool: The engine pool. Two engines are checked out, one for each
+     side.
+    :param white: The elo and move time of the white player.
+    :param black: The elo and move time of the black player.
+    :param max_plies: The game is drawn after this many plies.
+    :param time_control: The starting time and increment of each side, in
+     milliseconds. If given, the game is played on a clock and the players'
+     move times aren't used.
+    :return: Returns a dict with keys `white`, `black`, `moves`, `result`
+     (-1 for a draw, 0 for a white win, 1 for a black win), `reason` and
+     `ply_times` (how long each engine move took, in seconds).
+    """
+    board = Board()
+    players = (white, black)
+    ply_times = []
+
+    with pool.engine(white[0]) as white_engine, \
+            pool.engine(black[0]) as black_engine:
+        engines = (white_engine, black_engine)
+        if time_control is not None:
+            base, increment = time_control
+            board.set_clock(Clock(base, base, increment, increment))
+            white_engine.clock = black_engine.clock = board.clock
+        while True:
+            game_end = board.check_end_game()
+            if game_end is not None:
+                result, reason = game_end['result'], game_end['reason']
+                break
+
+            if board.position.halfmove >= FIFTY_MOVE_PLIES:
+                result, reason = DRAW, "By 50 Move Rule"
+                break
+
+            if len(board.moves) >= max_plies:
+                result, reason = DRAW, "By Move Limit"
+                break
+
+            side = len(board.moves) % 2
+            side_engine = engines[side]
+            side_engine.move_time = players[side][1]
+            side_engine.update(board.board_fen)
+
+            start = time.perf_counter()
+            move = side_engine.get_move()
+            ply_times.append(time.perf_counter() - start)
+            board.push_move(move)
+
+    return {'white': white, 'black': black, 'moves': board.moves,
+            'result': result, 'reason': reason, 'ply_times': ply_times}
+
+
+def save_game(games_dir: str, game: dict) -> None:
+    """
+    Saves a game in the same format as save_game() in gui.play(), as the
+    first self_play<n>.txt that doesn't exist yet.
+    :param games_dir: The folder to save the game in.
+    :param game: The result of play_game().
+    """
+    datetime_now = datetime.datetime.now()
+
+    formatted_date = datetime_now.strftime("%d %B %Y")
+    formatted_time = datetime_now.strftime("%I:%M.%S %p")
+
+    if game['result'] == DRAW:
+        winner = "Draw "
+    elif game['result'] == WHITE_WIN:
+        winner = "White wins "
+    else:
+        winner = "Black wins "
+
+    # Numbering from the file count would reuse a name if a file was
+    # deleted, so look for a free one.
+    num_games = len(os.listdir(games_dir))
+    while True:
+        num_games += 1
+        path = os.path.join(games_dir, f"self_play{num_games}.txt")
+        if not os.path.exists(path):
+            break
+
+    with open(path, 'x') as file:
+        file.write("User: self-play\n\n")
+        file.write(f"Date: {formatted_date}\n")
+        file.write(f"Time: {formatted_time}\n\n")
+        file.write(f"Engine ELO: {game['white'][0]} vs "
+                   f"{game['black'][0]}\n\n")
+        file.write(f"White: {player_name(game['white'])}\n")
+        file.write(f"Black: {player_name(game['black'])}\n")
+        file.write(f"Result: {winner}{game['reason']}\n\n")
+
+        count = 1
+        for move in game['moves']:
+            file.write(f"{count}. {move} ")
+            count += 1
+
+
+def crosstable_text(players: list[tuple[int, int]],
+                    crosstable: dict[str, dict[str, list[float]]]) -> str:
+    """
+    :param players: The players, in the order of the rows and columns.
+    :param crosstable: The crosstable from run_tournament().
+    :return: The crosstable as text, each cell giving the row players score
+     out of the games played against the column player.
+    """
+    names = [player_name(player) for player in players]
+    width = max(len(name) for name in names)
+    lines = [" " * width + "".join(f" | {i + 1:^9}"
+                                   for i in range(len(names)))]
+    for i, name in enumerate(names):
+        cells = []
+        for opponent in names:
+            if opponent == name:
+                cells.append(f" | {'-':^9}")
+            else:
+                score, games = crosstable[name][opponent]
+                cells.append(f" | {f'{score:g}/{games:g}':^9}")
+        lines.append(f"{name:<{width}}" + "".join(cells) + f"  ({i + 1})")
+    return "\n".join(lines)
+
+
+def run_tournament(players: list[tuple[int, int]],
+                   games: int = DEFAULT_GAMES, concurrency: int | None = None,
+                   games_dir: str = GAMES_DIR, max_plies: int = MAX_PLIES,
+                   path: list | None = None,
+                   time_control: tuple[int, int] | None = None) -> dict:
+    """
+    Plays a round robin between engine settings, several games at once.
+    Each pair of players plays `games` games, alternating colours.
+    :param players: The elo and move time of each player.
+    :param games: The number of games each pair of players plays.
+    :param concurrency: The number of games played at once. Defaults to
+     half the number of cores, as each game runs two engines.
+    :param games_dir: The folder the games are saved in.
+    :param max_plies: Games are drawn after this many plies.
+    :param path: The command used to start each engine.
+    :param time_control: The starting time and increment of each side, in
+     milliseconds. If None, the players' move times are used.
+    :return: Returns a dict with keys `games`, `seconds`, `games_per_hour`,
+     `average_ply_time` (in seconds) and `crosstable`, where
+     crosstable[a][b] is [a's score against b, games played].
+    """
+    schedule = []
+    for first, second in itertools.combinations(players, 2):
+        for game in range(games):
+            if game % 2 == 0:
+                schedule.append((first, second))
+            else:
+                schedule.append((second, first))
+
+    names = [player_name(player) for player in players]
+    crosstable = {name: {opponent: [0.0, 0] for opponent in names
+                         if opponent != name} for name in names}
+    ply_times = []
+    os.makedirs(games_dir, exist_ok=True)
+
+    concurrency = concurrency or max((os.cpu_count() or 1) // 2, 1)
+    concurrency = max(min(concurrency, len(schedule)), 1)
+    start = time.perf_counter()
+    pool = EnginePool(2 * concurrency, path)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(play_game, pool, white, black,
+                                       max_plies, time_control)
+                       for white, black in schedule]
+            for future in as_completed(futures):
+                game = future.result()
+                save_game(games_dir, game)
+                ply_times.extend(game['ply_times'])
+
+                white = player_name(game['white'])
+                black = player_name(game['black'])
+                if game['result'] == DRAW:
+                    white_score = 0.5
+                elif game['result'] == WHITE_WIN:
+                    white_score = 1.0
+                else:
+                    white_score = 0.0
+                crosstable[white][black][0] += white_score
+                crosstable[white][black][1] += 1
+                crosstable[black][white][0] += 1 - white_score
+                crosstable[black][white][1] += 1
+    finally:
+        pool.close()
+
+    seconds = time.perf_counter() - start
+    return {'games': len(schedule), 'seconds': seconds,
+            'games_per_hour': len(schedule) / seconds * SECONDS_PER_HOUR,
+            'average_ply_time': sum(ply_times) / len(ply_times)
+            if ply_times else None,
+            'crosstable': crosstable}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Play engine-vs-engine games between elo and move time "
+                    "settings.")
+    parser.add_argument("players", nargs="+",
+                        help="the players, each given as elo:move_time, "
+                             "e.g. 800:500")
+    parser.add_argument("--games", type=int, default=DEFAULT_GAMES,
+                        help="the number of games each pair plays")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="the number of games played at once")
+    parser.add_argument("--games-dir", default=GAMES_DIR,
+                        help="the folder to save the games in")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES,
+                        help="games are drawn after this many plies")
+    parser.add_argument("--engine", default=None,
+                        help="the command used to start the engine")
+    parser.add_argument("--time-control", type=parse_time_control,
+                        default=None,
+                        help="play on a clock, given as seconds+increment, "
+                             "e.g. 60+1, instead of the move times")
+    args = parser.parse_args()
+
+    players = [parse_player(player) for player in args.players]
+    if len(players) < 2:
+        parser.error("at least two players are needed")
+    # The crosstable is keyed by player name, so the same settings twice
+    # would be counted as one player.
+    if len(set(players)) < len(players):
+        parser.error("each player must be given only once")
+
+    path = shlex.split(args.engine) if args.engine else engine.DEFAULT_PATH
+    result = run_tournament(players, args.games, args.concurrency,
+                            args.games_dir, args.max_plies, path,
+                            args.time_control)
+
+    print(crosstable_text(players, result['crosstable']))
+    print(f"\n{result['games']} games in {result['seconds']:.1f} s "
+          f"({result['games_per_hour']:.0f} games/hour)")
+    if result['average_ply_time'] is not None:
+        print(f"Average ply time: "
+              f"{result['average_ply_time'] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
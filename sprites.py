@@ -0,0 +1,40 @@
+import pygame
+
+PIECES_DIR = "assets/pieces/"
+
+# The piece images as loaded from disk, keyed by letter, and the scaled
+# images, keyed by letter and size. Each image is loaded once, and scaled
+# once per size, however many boards and menus use it.
+_images: dict[str, pygame.Surface] = {}
+_sprites: dict[tuple[str, int], pygame.Surface] = {}
+
+
+def piece_path(letter: str) -> str:
+    """
+    :param letter: The pieces letter, upper case for white.
+    :return: The path of the pieces image.
+    """
+    side = "white" if letter.isupper() else "black"
+    return f"{PIECES_DIR}{side}/{letter}.svg"
+
+
+def piece_sprite(letter: str, size: int | None = None) -> pygame.Surface:
+    """
+    Gets the shared image of a piece. The surface is shared, so it shouldn't
+    be drawn on.
+    :param letter: The pieces letter, upper case for white.
+    :param size: The width and height to scale the image to. If None, the
+     image is returned at the size it was loaded at.
+    :return: The image.
+    """
+    if letter not in _images:
+        _images[letter] = pygame.image.load(piece_path(letter))
+    if size is None:
+        return _images[letter]
+
+    key = (letter, size)
+    if key not in _sprites:
+        _sprites[key] = pygame.transform.smoothscale(_images[letter],
+                                                     (size, size))
+    return _sprites[key]
+
@@ -0,0 +1,51 @@
+import random
+
+import pyffish
+
+import bitboard
+
+SEED = 1
+GAMES = 5
+# Stop games at the 50 move rule, as bitboard.main() does.
+MAX_HALFMOVES = 100
+
+
+def random_game_moves(rng: random.Random):
+    """
+    Plays a random game with the bitboard generator.
+    :param rng: The random number generator.
+    :return: Yields the FEN before each move and the move.
+    """
+    fen = pyffish.start_fen(bitboard.VARIANT)
+    while int(fen.split(' ')[4]) < MAX_HALFMOVES:
+        moves = bitboard.legal_moves(fen)
+        if not moves:
+            return
+        move = rng.choice(moves)
+        yield fen, move
+        fen = pyffish.get_fen(bitboard.VARIANT, fen, [move])
+
+
+def test_no_zobrist_collisions():
+    assert bitboard.zobrist_collisions(10000, random.Random(SEED)) == 0
+
+
+def test_push_updates_key():
+    rng = random.Random(SEED)
+    for _ in range(GAMES):
+        for fen, move in random_game_moves(rng):
+            position = bitboard.Position(fen)
+            position.push(move)
+            assert position.key == position.compute_key(), (fen, move)
+
+
+def test_pop_restores_position():
+    rng = random.Random(SEED)
+    for _ in range(GAMES):
+        for fen, move in random_game_moves(rng):
+            position = bitboard.Position(fen)
+            key = position.key
+            position.push(move)
+            position.pop()
+            assert position.fen() == fen, move
+            assert position.key == key, (fen, move)
@@ -0,0 +1,142 @@
+import time
+
+WHITE = 0
+BLACK = 1
+MS_PER_SECOND = 1000
+
+# Think time limits, in milliseconds.
+DEFAULT_BASE_TIME = 1500
+DEFAULT_MIN_TIME = 200
+DEFAULT_MAX_TIME = 3000
+
+# A position with this many legal moves gets the base time. Positions with
+# fewer or more moves get proportionally less or more, within these bounds.
+AVERAGE_LEGAL_MOVES = 15
+MIN_LEGAL_FACTOR = 0.5
+MAX_LEGAL_FACTOR = 1.5
+
+# Material values used to work out the game phase. Los Alamos starts with
+# 2 knights, 2 rooks and a queen each: 2 * (2 + 4 + 4) = 20.
+PHASE_VALUES = {'n': 1, 'r': 2, 'q': 4}
+START_PHASE = 20
+# The share of the time an endgame with no pieces (other than kings and
+# pawns) still gets.
+MIN_PHASE_FACTOR = 0.4
+
+# At limited strength the engine plays weaker moves on purpose, so extra
+# time is mostly wasted. The lowest elo gets this share of the time, and it
+# rises to the full time at the highest elo.
+MIN_ELO, MAX_ELO = 500, 2850
+MIN_ELO_FACTOR = 0.5
+
+
+def game_phase(fen: str) -> float:
+    """
+    Works out how far through the game a position is from its material.
+    :param fen: The FEN string of the position.
+    :return: 1.0 with all the pieces on the board, down to 0.0 with only
+     kings and pawns left.
+    """
+    placement = fen.split(' ')[0].lower()
+    material = sum(PHASE_VALUES.get(letter, 0) for letter in placement)
+    return min(material / START_PHASE, 1.0)
+
+
+class TimeManager:
+    def __init__(self, base_time: int = DEFAULT_BASE_TIME,
+                 min_time: int = DEFAULT_MIN_TIME,
+                 max_time: int = DEFAULT_MAX_TIME) -> None:
+        """
+        Chooses how long the engine thinks for each move, instead of a fixed
+        move time.
+        :param base_time: The think time for a typical position, in
+         milliseconds.
+        :param min_time: The shortest think time, in milliseconds.
+        :param max_time: The longest think time, in milliseconds.
+        """
+        self.base_time = base_time
+        self.min_time = min_time
+        self.max_time = max_time
+
+    def think_time(self, fen: str, legal_moves: list[str], elo: int) -> int:
+        """
+        Scales the base time by the number of legal moves, the game phase
+        and the engines elo.
+        :param fen: The FEN string of the position.
+        :param legal_moves: The legal moves in the position.
+        :param elo: The elo the engine is playing at.
+        :return: The think time in milliseconds. 0 if there is at most one
+         legal move, as there is nothing to think about.
+        """
+        if len(legal_moves) <= 1:
+            return 0
+
+        legal_factor = len(legal_moves) / AVERAGE_LEGAL_MOVES
+        legal_factor = max(MIN_LEGAL_FACTOR,
+                           min(legal_factor, MAX_LEGAL_FACTOR))
+
+        phase_factor = MIN_PHASE_FACTOR + \
+            (1 - MIN_PHASE_FACTOR) * game_phase(fen)
+
+        elo_share = (min(max(elo, MIN_ELO), MAX_ELO) - MIN_ELO) / \
+            (MAX_ELO - MIN_ELO)
+        elo_factor = MIN_ELO_FACTOR + (1 - MIN_ELO_FACTOR) * elo_share
+
+        think = self.base_time * legal_factor * phase_factor * elo_factor
+        return int(max(self.min_time, min(think, self.max_time)))
+
+
+class Clock:
+    def __init__(self, wtime: int, btime: int, winc: int = 0,
+                 binc: int = 0) -> None:
+        """
+        A chess clock for timed games. The engine is sent the remaining
+        times with `go wtime btime winc binc` and manages its own time.
+        :param wtime: Whites starting time, in milliseconds.
+        :param btime: Blacks starting time, in milliseconds.
+        :param winc: Whites increment per move, in milliseconds.
+        :param binc: Blacks increment per move, in milliseconds.
+        """
+        self.times: list[float] = [wtime, btime]
+        self.increments: list[int] = [winc, binc]
+        # When the clock was last pressed. None until the first move.
+        self.last_press: float | None = None
+
+    def press(self, side: int) -> None:
+        """
+        Called after a side moves. Takes the time they used off their clock
+        and adds their increment.
+        :param side: The side that just moved. 0 = white, 1 = black.
+        """
+        now = time.perf_counter()
+        if self.last_press is not None:
+            self.times[side] -= (now - self.last_press) * MS_PER_SECOND
+        self.times[side] += self.increments[side]
+        self.last_press = now
+
+    def remaining(self, side: int) -> int:
+        """
+        :param side: 0 = white, 1 = black.
+        :return: The time the side has left, in milliseconds. Doesn't count
+         the time used on the current move.
+        """
+        return max(int(self.times[side]), 0)
+
+    def flagged(self) -> int | None:
+        """
+        :return: The side that has run out of time, or None.
+        """
+        for side in (WHITE, BLACK):
+            if self.times[side] <= 0:
+                return side
+        return None
+
+    def go_command(self, ponder: bool = False) -> str:
+        """
+        :param ponder: Whether the search is a ponder search.
+        :return: The `go` command for the current clock times.
+        """
+        ponder_word = " ponder" if ponder else ""
+        return f"go{ponder_word} wtime {self.remaining(WHITE)} " \
+               f"btime {self.remaining(BLACK)} " \
+               f"winc {self.increments[WHITE]} binc {self.increments[BLACK]}\n"